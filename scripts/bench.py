@@ -0,0 +1,137 @@
+"""
+Helpers for the benchmarks (test modules named test_bench_*.py, marked
+`benchmark`).
+
+Benchmarks are skipped unless they are selected with `-m benchmark` or
+GIN_BENCHMARK=1 is set (see conftest.py). Each measurement is appended as a
+JSON line to bench/<benchmark>.jsonl in the log directory, with the gin
+version, the parameters of the measurement, and the duration and resource
+usage of the measured command.
+
+Parameters that make a benchmark very large (e.g., millions of files) are
+skipped unless they are enabled with GIN_BENCH_MAXFILES (default: 10000),
+GIN_BENCH_MAXCOMMITS (default: 1000) and GIN_BENCH_MAXSIZE (total size of
+generated files in MB, default: 1024).
+"""
+import json
+import os
+import time
+import pytest
+import testlog
+
+
+MAXFILES = int(os.environ.get("GIN_BENCH_MAXFILES", 10000))
+MAXCOMMITS = int(os.environ.get("GIN_BENCH_MAXCOMMITS", 1000))
+MAXSIZE = int(os.environ.get("GIN_BENCH_MAXSIZE", 1024))
+
+# maximum number of paths passed to a single command by runchunked()
+CHUNKSIZE = 1000
+
+# repository configuration for benchmarks: annex every file except those
+# excluded by the global test configuration (*.md, *.py, *.foo)
+ANNEXALL = """
+annex:
+  minsize: 0kB
+"""
+
+_ginversion = None
+
+
+def _limited(counts, maximum, name):
+    return [pytest.param(count, marks=pytest.mark.skipif(
+        count > maximum, reason=f"more than {name}={maximum}"
+    )) for count in counts]
+
+
+def nfiles(*counts):
+    """
+    pytest parameters for file counts; counts above GIN_BENCH_MAXFILES are
+    skipped.
+    """
+    return _limited(counts, MAXFILES, "GIN_BENCH_MAXFILES")
+
+
+def ncommits(*counts):
+    """
+    pytest parameters for history lengths; counts above GIN_BENCH_MAXCOMMITS
+    are skipped.
+    """
+    return _limited(counts, MAXCOMMITS, "GIN_BENCH_MAXCOMMITS")
+
+
+def skiplarge(totalkb):
+    """
+    Skip the calling benchmark if it would generate more than
+    GIN_BENCH_MAXSIZE MB of files.
+    """
+    if totalkb > MAXSIZE * 1024:
+        pytest.skip(f"{totalkb // 1024} MB of files is more than "
+                    f"GIN_BENCH_MAXSIZE={MAXSIZE}")
+
+
+def paths(count, depth=0, fanout=10, prefix="file", ext=""):
+    """
+    Relative paths for `count` files spread evenly over the leaf directories
+    of a tree with the given depth and fanout (files in the root if depth is
+    0).
+    """
+    dirs = [""]
+    for level in range(depth):
+        dirs = [os.path.join(parent, f"dir-{level}-{idx}")
+                for parent in dirs for idx in range(fanout)]
+    return [os.path.join(dirs[idx % len(dirs)], f"{prefix}-{idx}{ext}")
+            for idx in range(count)]
+
+
+def runchunked(r, args, paths):
+    """
+    Run a command with a long list of paths in chunks of CHUNKSIZE.
+    """
+    for idx in range(0, len(paths), CHUNKSIZE):
+        r.runcommand(*args, *paths[idx:idx+CHUNKSIZE])
+
+
+def writeconfig(r, config=ANNEXALL):
+    """
+    Write a repository configuration file (config.yml) in the runner's
+    working directory.
+    """
+    with open(r.path("config.yml"), "w") as conffile:
+        conffile.write(config)
+
+
+def measure(r, *args, inp=None, binary=True):
+    """
+    Run a command with the runner and return its CommandResult and a
+    dictionary with its duration and resource usage for record(). The output
+    is read as bytes unless `binary` is False.
+    """
+    result = r.run(*args, inp=inp, binary=binary)
+    measurement = {
+        "command": list(args),
+        "duration": result.duration,
+        "outbytes": len(result.stdout),
+    }
+    measurement.update(result.usage or dict())
+    return result, measurement
+
+
+def record(r, benchmark, **fields):
+    """
+    Append a measurement to the results of a benchmark.
+    """
+    global _ginversion
+    if _ginversion is None:
+        _ginversion, _ = r.runcommand("gin", "--version")
+    entry = {
+        "benchmark": benchmark,
+        "time": time.time(),
+        "gin": _ginversion,
+        "test": testlog.currenttest,
+    }
+    entry.update(fields)
+    benchdir = os.path.join(testlog.logdir, "bench")
+    os.makedirs(benchdir, exist_ok=True)
+    with open(os.path.join(benchdir, f"{benchmark}.jsonl"), "a") as resfile:
+        resfile.write(json.dumps(entry) + "\n")
+    print(f"{benchmark}: {json.dumps(fields)}")
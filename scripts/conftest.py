@@ -0,0 +1,51 @@
+import os
+import pytest
+import runner
+import testlog
+from repopool import RepoPool
+
+
+def pytest_collection_modifyitems(config, items):
+    # benchmarks only run when asked for
+    if (os.environ.get("GIN_BENCHMARK", "0") != "0" or
+            "benchmark" in (config.option.markexpr or "")):
+        return
+    skip = pytest.mark.skip(reason="benchmarks are selected with "
+                            "'-m benchmark' or GIN_BENCHMARK=1")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    # collect the records of all commands run during the test (including
+    # its setup and teardown)
+    item.cmdrecords = runner.cmdrecords = list()
+    testlog.starttest(item.nodeid)
+    yield
+    testlog.endtest()
+    runner.cmdrecords = None
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    if call.when == "teardown":
+        # properties are copied into the report, so add them before it's made
+        item.user_properties.append(("commands", item.cmdrecords))
+    yield
+
+
+@pytest.fixture(scope="session")
+def repopool():
+    # created on first use, so offline test runs don't touch the servers
+    pool = RepoPool()
+    yield pool
+    pool.close()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # wait for the runners' background teardowns
+    failed = runner.waitteardown()
+    if failed:
+        print("\nFailed to delete test repositories: " + ", ".join(failed))
@@ -1,4 +1,14 @@
 #!/usr/bin/env bash
+#
+# Delete test repositories from the server and leftover repository
+# directories.
+#
+# Usage: delete-all-test-repos.sh [worker]
+#
+# With a pytest-xdist worker ID (e.g., gw0), only the repositories created
+# by that worker are deleted.
+
+worker=${1:-}
 
 loc=$(cd $(dirname "${BASH_SOURCE[0]}") && pwd)
 pushd $loc/..
@@ -6,41 +16,85 @@ pushd $loc/..
 set -euo pipefail
 noconfirm=1 source testenv
 
-gin login $username <<< $password
+# the tests use both servers started by start-server
+gin add-server testb --web http://127.0.0.1:4000 --git git@127.0.0.1:2424 <<< yes
 
 # collect all test repo names
-testrepos=$(gin repos | grep -o "\w\+/gin-test-\(win-\)\?[0-9]\+" | sort -u)
-if [[ "$testrepos" != "" ]]
+if [[ -n "$worker" ]]
 then
-    echo "The following repositories will be deleted"
-    for reponame in $testrepos
+    pattern="gin-test-\(win-\)\?${worker}-[0-9]\+"
+else
+    pattern="gin-test-\(win-\)\?\(gw[0-9]\+-\)\?[0-9]\+"
+fi
+
+# collect the test repos on both servers first and confirm once, since the
+# automated scripts only provide a single line of input
+declare -A serverrepos
+for server in test testb
+do
+    gin use-server $server
+    gin login $username <<< $password
+    serverrepos[$server]=$(gin repos | grep -o "\w\+/${pattern}" | sort -u || true)
+    gin logout
+done
+
+if [[ -n "${serverrepos[test]}${serverrepos[testb]}" ]]
+then
+    for server in test testb
     do
-        echo -e "\t $reponame"
+        if [[ -n "${serverrepos[$server]}" ]]
+        then
+            echo "The following repositories will be deleted from server $server"
+            for reponame in ${serverrepos[$server]}
+            do
+                echo -e "\t $reponame"
+            done
+        fi
     done
     echo "Ctrl+C cancels"
-    read
+    read || true
 else
-    echo "No test repos on server"
+    echo "No test repos on servers"
 fi
 
 # deleting
-for reponame in $testrepos
+for server in test testb
 do
-    gin delete $reponame <<< $reponame
+    if [[ -z "${serverrepos[$server]}" ]]
+    then
+        continue
+    fi
+    gin use-server $server
+    gin login $username <<< $password
+    for reponame in ${serverrepos[$server]}
+    do
+        gin delete $reponame <<< $reponame
+    done
+    gin logout
 done
+gin use-server test
 
+# leftover directories are only looked for in the data directory of the
+# first server (../gin-data); the second server keeps its repositories inside
+# its container, where they are removed with the container by stop-server
 pushd ..
 repostore="./gin-data/gogs-repositories/$username/"
-if compgen -G "$repostore/gin-test-*" > /dev/null
+dirglob="gin-test-*"
+if [[ -n "$worker" ]]
 then
-    testrepos="$repostore/gin-test-*"
+    dirglob="gin-test-${worker}-*"
+fi
+if compgen -G "$repostore/$dirglob" > /dev/null
+then
+    testrepos="$repostore/$dirglob"
     echo "Deleting leftover files in the following directories"
     for dirname in $testrepos
     do
         echo -e "\t $dirname"
     done
     echo "Ctrl+C cancels"
-    read
+    # the single line of input may already have been used above
+    read || true
 
     # chmod and delete
     for reponame in $testrepos
@@ -51,6 +105,4 @@ then
     done
 fi
 
-gin logout
-
 echo "DONE!"
@@ -0,0 +1,120 @@
+"""
+Pool of empty repositories created on the test servers ahead of time.
+
+Creating a repository on the server is one of the slowest steps of most
+online test fixtures. The pool creates repositories in the background,
+starting with SIZE on a server when a repository is first taken from it,
+and replaces each one that is handed out. Used repositories are deleted in the background.
+
+The pool is shared by all tests of a session through the `repopool` fixture
+in conftest.py. Set GIN_TEST_REPOPOOL to change the number of repositories
+kept ready on each server; with 0, repositories are created when they are
+needed.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import runner
+import util
+
+
+SIZE = int(os.environ.get("GIN_TEST_REPOPOOL", 4))
+
+# number of server commands (create or delete) run at the same time
+WORKERS = 8
+
+
+class RepoPool(object):
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS,
+                                           thread_name_prefix="repopool")
+        self.lock = threading.Lock()
+        self.closed = False
+        # one runner per server, used for creating and deleting repositories
+        self.runners = dict()
+        # futures of repositories being created for each server
+        self.ready = dict()
+
+    def _ready(self, server):
+        """
+        Queue of the repositories for a server. The server's runner is
+        created and the queue is filled on first use, so servers no test
+        runs on are left alone.
+        """
+        with self.lock:
+            if server not in self.ready:
+                r = runner.Runner(chdir=False, server=server)
+                # the pool's runner doesn't count as a user of the server
+                runner.servers.release(r.server)
+                r.server = None
+                r.login()
+                self.runners[server] = r
+                self.ready[server] = queue.Queue()
+                for _ in range(self.size):
+                    self._create(server)
+            return self.ready[server]
+
+    def _newrepo(self, server):
+        """
+        Create an empty repository on the server and return its name.
+        """
+        reponame = util.randrepo()
+        self.runners[server].runcommand(
+            "gin", "create", "--no-clone", reponame,
+            "Test repository from the repository pool"
+        )
+        return reponame
+
+    def _create(self, server):
+        self.ready[server].put(self.executor.submit(self._newrepo, server))
+
+    def _delete(self, server, reponame):
+        r = self.runners[server]
+        repopath = f"{r.username}/{reponame}"
+        return self.executor.submit(r.runcommand, "gin", "delete", repopath,
+                                    inp=repopath, exit=False)
+
+    def get(self, r):
+        """
+        Take an empty repository from the runner's server and clone it into
+        the runner's working directory. Returns the repository name.
+
+        The repository is deleted by release(), not by the runner's cleanup.
+        """
+        try:
+            future = self._ready(r.server).get_nowait()
+        except queue.Empty:
+            # pool size 0 (or all repositories taken): create one now
+            reponame = self._newrepo(r.server)
+        else:
+            self._create(r.server)
+            reponame = future.result()
+        r.runcommand("gin", "get", f"{r.username}/{reponame}")
+        return reponame
+
+    def release(self, r, reponame):
+        """
+        Delete a repository taken by the runner in the background.
+        """
+        self._delete(r.server, reponame)
+
+    def close(self):
+        """
+        Delete all unused repositories and wait for pending deletions.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        for server, ready in self.ready.items():
+            while not ready.empty():
+                future = ready.get()
+                if future.exception() is None:
+                    self._delete(server, future.result())
+        self.executor.shutdown(wait=True)
+        for r in self.runners.values():
+            r.logout()
+            r.cleanup()
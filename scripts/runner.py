@@ -1,7 +1,14 @@
+import asyncio
+import atexit
 import sys
 import os
+import shutil
 import subprocess as sp
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import testlog
 import util
 
 
@@ -14,28 +21,429 @@ annex:
   minsize: 50kB
 """
 
+# amount of stderr output kept by CommandStream
+STDERRTAIL = 64 * 1024
+
+# Test servers started by start-server as (web, git) address pairs
+TESTSERVERS = (
+    ("http://127.0.0.2:3000", "git@127.0.0.2:2222"),
+    ("http://127.0.0.3:4000", "git@127.0.0.3:2424"),
+)
+
+# number of runner teardowns run in the background at the same time
+TEARDOWNWORKERS = 4
+
+# Resource usage records of all commands run by Runners. Set to a new list
+# for each test by conftest.py, which attaches it to the test report.
+cmdrecords = None
+
+
+def _readio(pid):
+    """
+    Read the I/O counters of a process from /proc/<pid>/io (Linux only).
+    """
+    usage = dict()
+    try:
+        with open(f"/proc/{pid}/io") as iofile:
+            for line in iofile:
+                name, value = line.split(":")
+                usage[name] = int(value)
+    except OSError:
+        pass
+    return usage
+
+
+def _exitcode(status):
+    # like Popen.returncode: negative signal number if the process was killed
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _reap(proc):
+    """
+    Wait for a process to exit and return its exit code and a dictionary with
+    its resource usage, where the platform provides it: user and system CPU
+    time (utime, stime) and peak RSS in kB (maxrss) from wait4() and the I/O
+    counters from /proc/<pid>/io (rchar, wchar, read_bytes, write_bytes,
+    ...). All values include the child processes the process waited for.
+    """
+    if not hasattr(os, "wait4"):
+        return proc.wait(), dict()
+    usage = dict()
+    if hasattr(os, "waitid") and os.path.exists(f"/proc/{proc.pid}/io"):
+        # Wait without reaping, so the I/O counters can still be read after
+        # the process (and with it the whole process tree) has finished.
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        usage.update(_readio(proc.pid))
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = _exitcode(status)
+    usage["utime"] = rusage.ru_utime
+    usage["stime"] = rusage.ru_stime
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    maxrss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        maxrss //= 1024
+    usage["maxrss"] = maxrss
+    return proc.returncode, usage
+
+
+def _communicate(proc, inp):
+    """
+    Write `inp` to a process' stdin and read all of its stdout and stderr.
+    Unlike Popen.communicate(), this doesn't wait for the process, so it can
+    be reaped by _reap().
+    """
+    stderr = list()
+    threads = [threading.Thread(target=lambda: stderr.append(
+        proc.stderr.read()))]
+    if inp:
+        def writein():
+            try:
+                proc.stdin.write(inp)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        threads.append(threading.Thread(target=writein))
+    for thread in threads:
+        thread.start()
+    stdout = proc.stdout.read()
+    for thread in threads:
+        thread.join()
+    proc.stdout.close()
+    proc.stderr.close()
+    return stdout, stderr[0]
+
+
+def _record(result, cwd):
+    testlog.command(result, cwd)
+    if cmdrecords is None:
+        return
+    record = {
+        "args": list(result.args),
+        "cwd": cwd,
+        "returncode": result.returncode,
+        "start": result.start,
+        "duration": result.duration,
+    }
+    record.update(result.usage)
+    cmdrecords.append(record)
+
+
+class CommandResult(object):
+    """
+    Exit code, output and timing of a command run by a Runner. Output is str
+    or bytes depending on how the command was run. `start` is the wall clock
+    time the command was started at and `duration` its run time in seconds.
+    `usage` holds the resource usage of the command's process tree (see
+    _reap()). For streamed commands, `output` is the part of the output kept
+    for the logs (see CommandStream).
+    """
+
+    def __init__(self, args, returncode, stdout, stderr, start, duration,
+                 usage=None):
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.start = start
+        self.duration = duration
+        self.usage = usage or dict()
+        self.output = None
+
+
+class CommandStream(object):
+    """
+    A running command started with Runner.stream(). Iterating over it yields
+    its stdout as it is produced. When the output is exhausted, the process
+    is waited for and `result` is set to a CommandResult whose stdout is the
+    amount of output read (characters in text mode, bytes otherwise) and
+    whose stderr is the tail of the error output.
+
+    In text mode, the beginning of the output (as much as testlog.truncate()
+    keeps from the start) is kept in `result.output` for the logs.
+    """
+
+    def __init__(self, runner, args, inp, exit, binary, chunksize):
+        self.runner = runner
+        self.args = args
+        self.exit = exit
+        self.chunksize = chunksize
+        self.result = None
+        text = not (binary or chunksize)
+        self.head = list() if text else None
+        self.headlen = 0
+        self.headcap = testlog.OUTPUTCAP // 2
+        self.start = time.time()
+        self.tstart = time.monotonic()
+        self.proc_cwd = runner.cmdloc
+        self.proc = sp.Popen(args, env=runner.env, cwd=runner.cmdloc,
+                             stdin=sp.PIPE if inp else None,
+                             stdout=sp.PIPE, stderr=sp.PIPE,
+                             encoding="utf-8" if text else None)
+        self.errtail = bytearray()
+        self.threads = [threading.Thread(target=self._readerr, daemon=True)]
+        if inp:
+            if not text:
+                inp = inp.encode("utf-8")
+            self.threads.append(threading.Thread(target=self._writein,
+                                                 args=(inp,), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def _writein(self, inp):
+        try:
+            self.proc.stdin.write(inp)
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _readerr(self):
+        # read raw bytes, also in text mode
+        stderr = getattr(self.proc.stderr, "buffer", self.proc.stderr)
+        for chunk in iter(lambda: stderr.read1(STDERRTAIL), b""):
+            self.errtail.extend(chunk)
+            del self.errtail[:-STDERRTAIL]
+
+    def __iter__(self):
+        stdout = self.proc.stdout
+        if self.chunksize:
+            chunks = iter(lambda: stdout.read1(self.chunksize), b"")
+        else:
+            chunks = stdout
+        nbytes = 0
+        for chunk in chunks:
+            nbytes += len(chunk)
+            if self.head is not None and self.headlen < self.headcap:
+                keep = chunk[:self.headcap - self.headlen]
+                self.head.append(keep)
+                self.headlen += len(keep)
+            yield chunk
+        self._finish(nbytes)
+
+    def _finish(self, nbytes):
+        returncode, usage = _reap(self.proc)
+        duration = time.monotonic() - self.tstart
+        for thread in self.threads:
+            thread.join()
+        self.proc.stdout.close()
+        self.proc.stderr.close()
+        stderr = self.errtail.decode("utf-8", errors="replace")
+        self.result = CommandResult(self.args, returncode, nbytes, stderr,
+                                    self.start, duration, usage)
+        if self.head is not None:
+            output = "".join(self.head)
+            if nbytes > self.headlen:
+                output += (f"\n[... {nbytes - self.headlen} more characters "
+                           "streamed ...]\n")
+            self.result.output = output
+        _record(self.result, self.proc_cwd)
+        if self.result.output is None:
+            self.runner.log(f"Out: {nbytes} streamed")
+        elif self.result.output.strip():
+            self.runner.log(f"Out: {self.result.output.strip()}")
+        if stderr.strip():
+            self.runner.log(f"Err: {stderr.strip()}")
+        if returncode and self.exit:
+            sys.exit(returncode)
+
+    def close(self):
+        """
+        Stop the command if its output hasn't been read to the end.
+        """
+        if self.result is None:
+            self.proc.kill()
+            self.exit = False
+            self._finish(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _testservers():
+    """
+    Read the configured test servers from the environment:
+    - GIN_TEST_SERVERS: whitespace separated list of web,git address pairs.
+    - GIN_TEST_SRV and GIN_TEST_GIT: a single server.
+    Defaults to the servers started by start-server (TESTSERVERS).
+    """
+    if os.environ.get("GIN_TEST_SERVERS"):
+        return [tuple(server.split(",", 1))
+                for server in os.environ["GIN_TEST_SERVERS"].split()]
+    if os.environ.get("GIN_TEST_SRV"):
+        return [(os.environ["GIN_TEST_SRV"],
+                 os.environ.get("GIN_TEST_GIT", "git@127.0.0.2:2222"))]
+    return list(TESTSERVERS)
+
+
+class ServerPool(object):
+    """
+    Assigns test servers to runners. Each runner gets the server with the
+    fewest runners using it, so tests that don't depend on a specific server
+    are spread over all configured servers.
+
+    When running under pytest-xdist, ties are broken starting from a
+    different server for each worker, so that workers running one test at a
+    time use different servers.
+    """
+
+    def __init__(self, servers):
+        self.servers = list(servers)
+        self.load = [0] * len(self.servers)
+        self.lock = threading.Lock()
+        worker = os.environ.get("PYTEST_XDIST_WORKER", "")
+        self.offset = int(worker[2:]) if worker[2:].isdigit() else 0
+
+    def acquire(self, server=None):
+        """
+        Return the least loaded server (or the given one) as a (web, git)
+        pair and count the caller as one of its users until release() is
+        called.
+        """
+        nservers = len(self.servers)
+        with self.lock:
+            if server is None:
+                idx = min(range(nservers),
+                          key=lambda i: (self.load[i],
+                                         (i - self.offset) % nservers))
+            else:
+                idx = self.servers.index(server)
+            self.load[idx] += 1
+        return self.servers[idx]
+
+    def release(self, server):
+        """
+        Stop counting the caller as a user of the server. Does nothing if
+        `server` is None (the caller's server was already released).
+        """
+        if server is None:
+            return
+        with self.lock:
+            idx = self.servers.index(server)
+            self.load[idx] = max(self.load[idx] - 1, 0)
+
+
+servers = ServerPool(_testservers())
+
+
+_teardown = None
+_teardownlock = threading.Lock()
+
+
+def _teardowncmd(args, env, cwd, inp=None):
+    """
+    Run a command for a background teardown job. Failures are logged.
+    """
+    testlog.log(f"[teardown] > {' '.join(args)}")
+    proc = sp.run(args, env=env, cwd=cwd, input=inp + "\n" if inp else None,
+                  stdout=sp.PIPE, stderr=sp.PIPE, encoding="utf-8")
+    if proc.returncode:
+        testlog.log(f"[teardown] Command failed with exit code "
+                    f"{proc.returncode}: {proc.stderr.strip()}")
+    return proc.returncode
+
+
+def _teardownjob(trash, env, repos, logout):
+    """
+    Delete a runner's server repositories, log it out if necessary, and
+    remove its test directory (moved to `trash`).
+    """
+    failed = list()
+    for repopath in repos:
+        if _teardowncmd(("gin", "delete", repopath), env, trash,
+                        inp=repopath):
+            failed.append(repopath)
+    if logout:
+        _teardowncmd(("gin", "logout"), env, trash)
+    # already running in the teardown pool
+    util.rmtree_force(trash, workers=0)
+    return failed
+
+
+def teardown(trash, env, repos, logout):
+    """
+    Queue a teardown job in the background worker pool. The pool and its
+    trash directory are created on first use.
+    """
+    global _teardown
+    with _teardownlock:
+        if _teardown is None:
+            _teardown = ThreadPoolExecutor(max_workers=TEARDOWNWORKERS,
+                                           thread_name_prefix="teardown")
+            _teardown.futures = list()
+            atexit.register(waitteardown)
+        future = _teardown.submit(_teardownjob, trash, env, repos, logout)
+        _teardown.futures.append(future)
+
+
+def trashdir():
+    """
+    Directory for test directories waiting to be removed (created next to
+    the test directories, so they can be renamed into it).
+    """
+    path = os.path.join(tempfile.gettempdir(), f"gintest-trash-{os.getpid()}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def waitteardown():
+    """
+    Wait for all background teardown jobs to finish and return the
+    repositories that could not be deleted from the server.
+    """
+    global _teardown
+    with _teardownlock:
+        executor, _teardown = _teardown, None
+    if executor is None:
+        return list()
+    executor.shutdown(wait=True)
+    failed = list()
+    for future in executor.futures:
+        exc = future.exception()
+        if exc:
+            testlog.log(f"[teardown] Failed: {exc!r}")
+        else:
+            failed.extend(future.result())
+    try:
+        os.rmdir(trashdir())
+    except OSError:
+        pass
+    return failed
+
 
 class Runner(object):
 
     username = "testuser"
     password = "a test password 42"
 
-    def __init__(self, set_server_conf=True):
+    def __init__(self, set_server_conf=True, chdir=True, server=None):
+        """
+        The test server is assigned from the server pool unless a `server`
+        (a (web, git) address pair from the pool) is given.
+
+        If `chdir` is False, the runner never changes the working directory
+        of the process. Its working directory is only used for the commands
+        it runs and for resolving paths with path(), so multiple runners can
+        be used from different threads.
+        """
         self.loc = os.path.dirname(os.path.abspath(__file__))
         self.testroot = tempfile.TemporaryDirectory(prefix="gintest")
         self.cmdloc = self.testroot.name
-        os.chdir(self.cmdloc)
+        self.chdir = chdir
+        if chdir:
+            os.chdir(self.cmdloc)
         self.env = os.environ.copy()
         # write configuration file for annex excludes and set up test server
         # config
         confdir = os.path.join(self.cmdloc, "conf")
 
-        self.logdir = os.path.realpath(os.path.join(self.loc,  "..", "log"))
+        self.logdir = testlog.logdir
         os.makedirs(confdir, exist_ok=True)
         os.makedirs(self.logdir, exist_ok=True)
 
-        self.outlog = os.path.join(self.logdir, "runner.log")
-
         self.log("== Initialised runner ==")
         self.log(f"Test directory: {self.cmdloc}")
 
@@ -47,66 +455,273 @@ class Runner(object):
         with open(os.path.join(confdir, "config.yml"), "w") as conffile:
             conffile.write(TESTCONFIG)
         self.repositories = dict()
+        self.catfiles = dict()
+        self.server = None
+        self.loggedin = False
+        self.cleanedup = False
         if set_server_conf:
-            self._set_server_conf()
+            self._set_server_conf(server)
 
     def log(self, msg):
-        with open(self.outlog, "a") as logfile:
-            logfile.write(msg + "\n")
+        testlog.log(msg)
 
-    def _set_server_conf(self):
-        testserver = self.env.get("GIN_TEST_SRV",  "http://127.0.0.2:3000")
-        testservergit = self.env.get("GIN_TEST_GIT", "git@127.0.0.2:2222")
+    def _set_server_conf(self, server=None):
+        # the server is released in cleanup()
+        self.server = servers.acquire(server)
+        testserver, testservergit = self.server
+        self.log(f"Test server: {testserver} ({testservergit})")
         self.runcommand("gin", "add-server", "test",
                         "--web", testserver,
                         "--git", testservergit,
                         inp="yes")
         self.runcommand("gin", "use-server", "test")
 
+    def run(self, *args, inp=None, exit=True, binary=False):
+        """
+        Run a command in the runner's working directory and return a
+        CommandResult with its exit code, timing and complete output.
+
+        Output is decoded as UTF-8 text unless `binary` is True, in which
+        case stdout and stderr are returned as bytes. Binary output is not
+        written to the log.
+        """
+        self.log(f"> {' '.join(args)}")
+        if inp:
+            self.log(f"Input: {inp}")
+            inp += "\n"
+            if binary:
+                inp = inp.encode("utf-8")
+        encoding = None if binary else "utf-8"
+        start = time.time()
+        tstart = time.monotonic()
+        p = sp.Popen(args, env=self.env, cwd=self.cmdloc,
+                     stdin=sp.PIPE if inp else None,
+                     stdout=sp.PIPE, stderr=sp.PIPE, encoding=encoding)
+        stdout, stderr = _communicate(p, inp)
+        returncode, usage = _reap(p)
+        result = CommandResult(args, returncode, stdout, stderr,
+                               start, time.monotonic() - tstart, usage)
+        _record(result, self.cmdloc)
+        if binary:
+            self.log(f"Out: {len(stdout)} bytes")
+            self.log(f"Err: {len(stderr)} bytes")
+        else:
+            if stdout.strip():
+                self.log(f"Out: {stdout.strip()}")
+            if stderr.strip():
+                self.log(f"Err: {stderr.strip()}")
+        if returncode and exit:
+            sys.exit(returncode)
+
+        return result
+
     def runcommand(self, *args, inp=None, exit=True):
+        result = self.run(*args, inp=inp, exit=exit)
+        return result.stdout.strip(), result.stderr.strip()
+
+    def stream(self, *args, inp=None, exit=True, binary=False,
+               chunksize=None):
+        """
+        Start a command in the runner's working directory and return a
+        CommandStream that yields its stdout as it is produced: lines of
+        text, lines of bytes if `binary` is True, or blocks of up to
+        `chunksize` bytes as they arrive if set.
+
+        Only the byte count of stdout and the last STDERRTAIL bytes of stderr
+        are kept, so memory use is bounded for any amount of output.
+        """
         self.log(f"> {' '.join(args)}")
         if inp:
             self.log(f"Input: {inp}")
             inp += "\n"
-        p = sp.run(args, env=self.env, stdout=sp.PIPE, stderr=sp.PIPE,
-                   cwd=self.cmdloc, input=inp, encoding="utf-8")
-        stdout, stderr = p.stdout.strip(), p.stderr.strip()
-        # if exiting, force enable echo
-        if stdout:
-            self.log(f"Out: {stdout}")
-        if stderr:
-            self.log(f"Err: {stderr}")
-        if p.returncode and exit:
-            sys.exit(p.returncode)
-
-        return stdout, stderr
+        return CommandStream(self, args, inp, exit, binary, chunksize)
 
     def cdrel(self, path="."):
         """
-        Changes the working directory for the runner as well as the caller.
+        Changes the working directory for the runner as well as the caller
+        (unless the runner was created with chdir=False).
 
         With default argument '.', sets the working directory of the caller to
         the existing wd of the runner.
         """
         self.cmdloc = os.path.abspath(os.path.join(self.cmdloc, path))
-        os.chdir(self.cmdloc)
+        if self.chdir:
+            os.chdir(self.cmdloc)
         print(f"New dir: {self.cmdloc}")
 
+    def path(self, *parts):
+        """
+        Resolve a path relative to the runner's working directory.
+        """
+        return os.path.join(self.cmdloc, *parts)
+
     def login(self, username=username, password=password):
         self.username = username
         self.password = password
-        return self.runcommand("gin", "login", username, inp=password)
+        out = self.runcommand("gin", "login", username, inp=password)
+        self.loggedin = True
+        return out
 
     def cleanup(self):
-        loc = self.cmdloc
-        for location, repo in self.repositories.items():
-            if repo:
-                repopath = f"{self.username}/{repo}"
-                self.runcommand("gin", "delete", repopath, inp=repopath)
-        util.set_rwx_recursive(self.testroot.name)
-        self.cmdloc = loc
+        """
+        Delete the runner's repositories from the server and remove its test
+        directory.
+
+        The test directory is moved aside and the work is done by a
+        background worker (see teardown()), so cleanup() returns
+        immediately. If the runner is logged in, it is logged out by the
+        same worker after deleting the repositories, so a following call to
+        logout() does nothing.
+        """
+        if self.cleanedup:
+            return
+        self.cleanedup = True
+        for catfile in self.catfiles.values():
+            catfile.close()
+        self.catfiles.clear()
+        if self.server:
+            servers.release(self.server)
+            self.server = None
+        repos = [f"{self.username}/{repo}"
+                 for repo in self.repositories.values() if repo]
         # cd out of tempdir
+        self.cmdloc = self.testroot.name
         self.cdrel("/")
 
+        root = self.testroot.name
+        trash = os.path.join(trashdir(), os.path.basename(root))
+        env = None
+        if repos or self.loggedin:
+            # copy, since runners can share an env (e.g., test_conflicts)
+            env = self.env.copy()
+            confdir = os.path.abspath(env["GIN_CONFIG_DIR"])
+            if os.path.commonpath([confdir, root]) == root:
+                env["GIN_CONFIG_DIR"] = os.path.join(
+                    trash, os.path.relpath(confdir, root)
+                )
+            else:
+                # config outside the test directory may be removed by the
+                # test before the teardown runs
+                env["GIN_CONFIG_DIR"] = os.path.join(trash, "teardown-conf")
+        os.rename(root, trash)
+        if env and not os.path.exists(env["GIN_CONFIG_DIR"]):
+            shutil.copytree(confdir, env["GIN_CONFIG_DIR"])
+        # leave an empty directory for the TemporaryDirectory to remove
+        os.mkdir(root)
+        teardown(trash, env, repos, self.loggedin)
+        self.loggedin = False
+
     def logout(self):
+        if not self.loggedin:
+            return
         self.runcommand("gin", "logout", exit=False)
+        self.loggedin = False
+
+
+class CommandError(Exception):
+    """
+    Raised by AsyncRunner coroutines when a command fails and `exit` is set.
+    """
+
+    def __init__(self, returncode):
+        super().__init__(f"command failed with exit code {returncode}")
+        self.returncode = returncode
+
+
+class AsyncRunner(Runner):
+    """
+    Runner with coroutine versions of run() and runcommand() for running
+    several commands at the same time, e.g., from multiple clients using
+    one server. Use gather() or runall() to run the coroutines.
+
+    Commands run this way are timed but have no resource usage, since the
+    asyncio event loop reaps the processes itself.
+
+    A failing command raises CommandError instead of exiting, since
+    SystemExit can't be raised cleanly from inside the event loop. gather()
+    lets it propagate and runall() and runmany() exit with its exit code, like
+    Runner.runcommand().
+    """
+
+    async def arun(self, *args, inp=None, exit=True, binary=False):
+        """
+        Coroutine version of Runner.run().
+        """
+        self.log(f"> {' '.join(args)}")
+        if inp:
+            self.log(f"Input: {inp}")
+            inp += "\n"
+        start = time.time()
+        tstart = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *args, env=self.env, cwd=self.cmdloc,
+            stdin=sp.PIPE if inp else None, stdout=sp.PIPE, stderr=sp.PIPE
+        )
+        stdout, stderr = await proc.communicate(
+            inp.encode("utf-8") if inp else None
+        )
+        if not binary:
+            stdout = _decode(stdout)
+            stderr = _decode(stderr)
+        result = CommandResult(args, proc.returncode, stdout, stderr,
+                               start, time.monotonic() - tstart)
+        _record(result, self.cmdloc)
+        if binary:
+            self.log(f"Out: {len(stdout)} bytes")
+            self.log(f"Err: {len(stderr)} bytes")
+        else:
+            if stdout.strip():
+                self.log(f"Out: {stdout.strip()}")
+            if stderr.strip():
+                self.log(f"Err: {stderr.strip()}")
+        if proc.returncode and exit:
+            raise CommandError(proc.returncode)
+
+        return result
+
+    async def aruncommand(self, *args, inp=None, exit=True):
+        """
+        Coroutine version of Runner.runcommand().
+        """
+        result = await self.arun(*args, inp=inp, exit=exit)
+        return result.stdout.strip(), result.stderr.strip()
+
+    async def gather(self, *commands, exit=True):
+        """
+        Run all `commands` (tuples of command arguments) concurrently and
+        return a list of (stdout, stderr) tuples, in the same order.
+        """
+        return await asyncio.gather(*(self.aruncommand(*cmd, exit=exit)
+                                      for cmd in commands))
+
+    def runmany(self, *commands, exit=True):
+        """
+        Blocking version of gather().
+        """
+        return runall(self.gather(*commands, exit=exit))[0]
+
+
+def _decode(output):
+    # same as text mode pipes: decode and translate newlines
+    output = output.decode("utf-8")
+    return output.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def runall(*coros):
+    """
+    Run coroutines (e.g., AsyncRunner.aruncommand() calls on several runners)
+    concurrently and return their results in order.
+    """
+    async def gatherall():
+        return await asyncio.gather(*coros)
+    # a new loop for each call instead of asyncio.run() (Python 3.7+); it is
+    # set as the current loop so the child watcher is attached to it
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(gatherall())
+    except CommandError as err:
+        sys.exit(err.returncode)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
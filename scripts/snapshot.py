@@ -0,0 +1,286 @@
+"""
+Snapshot cache for expensive offline fixtures.
+
+A fixture passes the function that builds its state to cached(). The first
+time, the function is run and the runner's test directory (with the
+repository) and any other directories the fixture uses (e.g., dir:
+remotes) are saved in a tarball together with the JSON state returned by
+the build function. Later runs extract the tarball instead of building.
+
+Snapshots are keyed on the source of the module of the build function,
+util.py, runner.py (e.g., the annex rules of the test configuration) and
+snapshot.py, the output of `gin --version`, and an optional seed, so changes
+to any of them cause a rebuild; older snapshots of the same fixture are
+deleted when a new one is saved. Paths of the old test directories in git
+config files (e.g., remote URLs) are replaced with the new ones when
+restoring.
+
+Snapshots are stored in GIN_TEST_SNAPSHOTDIR (default: gin-test-snapshots
+in the system temporary directory). Set GIN_TEST_SNAPSHOTS=0 to always run
+the build functions.
+
+Long scenario tests are split into stages run by Checkpoints.run(), which
+saves a snapshot before each stage if GIN_TEST_CHECKPOINTS=1 is set. With
+GIN_TEST_RESUME=<stage>, the stages before the named one are skipped and
+the scenario continues from its snapshot. Checkpoints are not keyed on the
+sources or gin version, so they survive changes to both (a warning is logged
+on resume instead).
+"""
+import glob
+import hashlib
+import inspect
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import runner
+import util
+
+
+SNAPSHOTDIR = os.environ.get(
+    "GIN_TEST_SNAPSHOTDIR",
+    os.path.join(tempfile.gettempdir(), "gin-test-snapshots")
+)
+
+ENABLED = os.environ.get("GIN_TEST_SNAPSHOTS", "1") != "0"
+
+# save a snapshot before each stage of Checkpoints scenarios
+CHECKPOINTS = os.environ.get("GIN_TEST_CHECKPOINTS", "0") != "0"
+# stage to resume Checkpoints scenarios from
+RESUME = os.environ.get("GIN_TEST_RESUME")
+
+# length of snapshot keys (hex digits)
+KEYLEN = 16
+
+_ginversion = None
+
+
+def _version(r):
+    global _ginversion
+    if _ginversion is None:
+        _ginversion, _ = r.runcommand("gin", "--version")
+    return _ginversion
+
+
+def key(r, build, seed=None):
+    """
+    Key for the snapshot of the state made by `build`.
+    """
+    keyhash = hashlib.sha256()
+    keyhash.update(inspect.getsource(inspect.getmodule(build))
+                   .encode("utf-8"))
+    for module in (util, runner, sys.modules[__name__]):
+        keyhash.update(inspect.getsource(module).encode("utf-8"))
+    keyhash.update(_version(r).encode("utf-8"))
+    keyhash.update(repr(seed).encode("utf-8"))
+    return keyhash.hexdigest()[:KEYLEN]
+
+
+def _gitconfigs(path):
+    """
+    Paths (relative to `path`) of the config files of all git repositories
+    under `path`, including bare repositories.
+    """
+    configs = list()
+    for root, dirs, files in os.walk(path):
+        if "config" in files and "HEAD" in files:
+            configs.append(os.path.relpath(os.path.join(root, "config"),
+                                           path))
+        # skip object stores
+        dirs[:] = [d for d in dirs if d not in ("objects", "annex")]
+    return configs
+
+
+def save(r, name, dirs=(), state=None, sources=None):
+    """
+    Save the runner's test directory, the directories in `dirs`, and the
+    JSON serialisable `state` dictionary as snapshot `name`. `sources` (a
+    key() of the code and gin version that made the state) is stored for
+    the staleness check of restore().
+    """
+    roots = [r.testroot.name] + list(dirs)
+    meta = {
+        "roots": roots,
+        "cmdloc": os.path.relpath(r.cmdloc, r.testroot.name),
+        "configs": [_gitconfigs(root) for root in roots],
+        "state": state or dict(),
+        "sources": sources,
+    }
+    os.makedirs(SNAPSHOTDIR, exist_ok=True)
+    fname = os.path.join(SNAPSHOTDIR, f"{name}.tar")
+    # write to a temporary file so parallel test runs never see a partial
+    # snapshot
+    tmpname = f"{fname}.{os.getpid()}"
+    with tarfile.open(tmpname, "w") as tar:
+        for idx, root in enumerate(roots):
+            tar.add(root, arcname=str(idx))
+        metadata = json.dumps(meta).encode("utf-8")
+        info = tarfile.TarInfo("meta.json")
+        info.size = len(metadata)
+        tar.addfile(info, fileobj=io.BytesIO(metadata))
+    os.replace(tmpname, fname)
+    r.log(f"Saved snapshot {fname}")
+
+
+def _prune(name):
+    """
+    Delete the snapshots of the same fixture or stage as snapshot `name`
+    with other keys.
+    """
+    prefix, _, _ = name.rpartition("-")
+    pattern = os.path.join(SNAPSHOTDIR,
+                           f"{glob.escape(prefix)}-{'[0-9a-f]' * KEYLEN}.tar")
+    for fname in glob.glob(pattern):
+        if os.path.basename(fname) != f"{name}.tar":
+            try:
+                os.unlink(fname)
+            except FileNotFoundError:
+                # pruned by a parallel test run
+                pass
+
+
+def restore(r, name, dirs=(), sources=None):
+    """
+    Restore snapshot `name` into the runner's test directory and the
+    (empty) directories in `dirs`, and change the runner's working directory
+    to the one it had when the snapshot was saved. Returns the saved state,
+    or None if there is no snapshot.
+
+    If `sources` is given and differs from the one saved with the snapshot,
+    a warning is logged, since the code or gin version changed since the
+    snapshot was made.
+    """
+    fname = os.path.join(SNAPSHOTDIR, f"{name}.tar")
+    if not os.path.exists(fname):
+        return None
+    roots = [r.testroot.name] + list(dirs)
+    with tarfile.open(fname) as tar:
+        meta = json.load(tar.extractfile("meta.json"))
+        if len(meta["roots"]) != len(roots):
+            return None
+        if sources is not None and meta.get("sources") != sources:
+            msg = (f"Warning: snapshot {fname} was made by different code or "
+                   "gin version")
+            print(msg)
+            r.log(msg)
+        for idx, root in enumerate(roots):
+            members = [member for member in tar.getmembers()
+                       if member.name.split("/")[0] == str(idx)]
+            # strip the root prefix (with string operations, since the
+            # working directory may have been removed by Checkpoints)
+            prefix = len(str(idx)) + 1
+            for member in members:
+                member.name = member.name[prefix:] or "."
+                if member.islnk():
+                    member.linkname = member.linkname[prefix:]
+            kwargs = dict()
+            if hasattr(tarfile, "tar_filter"):
+                kwargs["filter"] = "tar"
+            tar.extractall(root, members=members, **kwargs)
+
+    # point remotes and other paths at the new directories
+    for root, configs in zip(roots, meta["configs"]):
+        for config in configs:
+            path = os.path.join(root, config)
+            with open(path) as conffile:
+                content = conffile.read()
+            for oldroot, newroot in zip(meta["roots"], roots):
+                content = content.replace(oldroot, newroot)
+            with open(path, "w") as conffile:
+                conffile.write(content)
+
+    r.cmdloc = r.testroot.name
+    r.cdrel(meta["cmdloc"])
+    r.log(f"Restored snapshot {fname}")
+    return meta["state"]
+
+
+def _clear(path):
+    """
+    Remove everything in a directory.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                util.rmtree_force(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+def cached(r, build, dirs=(), seed=None):
+    """
+    Restore the state made by `build` from a snapshot, or run build() and
+    save a snapshot. `build` is called without arguments and returns a JSON
+    serialisable dictionary (or None), which is returned by cached().
+    """
+    if not ENABLED:
+        return build() or dict()
+    fixture = build.__qualname__.split(".")[0]
+    name = f"{build.__module__}.{fixture}-{key(r, build, seed)}"
+    state = restore(r, name, dirs)
+    if state is None:
+        state = build() or dict()
+        save(r, name, dirs, state)
+        _prune(name)
+    return state
+
+
+class Checkpoints(object):
+    """
+    Runs the stages of a scenario test with checkpoints.
+
+    Stages are functions called with the runner and a JSON serialisable
+    state dictionary (e.g., the expected status counts), which they update.
+    The runner's test directory, the directories in `dirs` and the state are
+    saved before each stage when GIN_TEST_CHECKPOINTS is set, and restored
+    when resuming from a stage with GIN_TEST_RESUME.
+
+    Checkpoints are named after the module, position and name of their
+    stage only, so a scenario can be resumed after changing its later stages
+    or switching to another gin binary (e.g., for bisecting a regression). A
+    warning is logged if the code or gin version differ from the ones that
+    saved the checkpoint.
+
+    Only repositories with local (dir:) remotes can be restored, since the
+    state of a server is not included, so checkpoints are ignored if
+    `enabled` is False.
+    """
+
+    def __init__(self, r, dirs=(), enabled=True):
+        self.r = r
+        self.dirs = list(dirs)
+        self.enabled = enabled and ENABLED
+
+    def _name(self, idx, stage):
+        return f"{stage.__module__}.checkpoint-{idx}-{stage.__name__}"
+
+    def run(self, stages, state):
+        r = self.r
+        names = [stage.__name__ for stage in stages]
+        resume = RESUME if self.enabled and RESUME in names else None
+        for idx, stage in enumerate(stages):
+            if resume:
+                if stage.__name__ != resume:
+                    r.log(f"Skipping stage {stage.__name__}")
+                    continue
+                resume = None
+                name = self._name(idx, stage)
+                for path in [r.testroot.name] + self.dirs:
+                    _clear(path)
+                restored = restore(r, name, self.dirs,
+                                   sources=key(r, stage))
+                if restored is None:
+                    raise RuntimeError(
+                        f"No checkpoint saved for stage {stage.__name__}; "
+                        "run the test with GIN_TEST_CHECKPOINTS=1 first"
+                    )
+                state.clear()
+                state.update(restored)
+            elif self.enabled and CHECKPOINTS:
+                save(r, self._name(idx, stage), self.dirs, state,
+                     sources=key(r, stage))
+            r.log(f"Stage {stage.__name__}")
+            stage(r, state)
+        return state
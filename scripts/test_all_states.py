@@ -2,26 +2,26 @@
 Runs through all possible file states and checks the output of 'gin ls'.
 """
 import os
-import shutil
 import tempfile
 from runner import Runner
 import util
+import snapshot
 import pytest
 
 
 @pytest.fixture
-def runner():
+def runner(repopool):
     r = Runner(True)
     r.login()
 
-    reponame = util.randrepo()
-    r.runcommand("gin", "create", reponame,
-                 "Test repository for all states")
+    reponame = repopool.get(r)
     r.cdrel(reponame)
-    r.repositories[r.cmdloc] = reponame
+    # deleted by the pool
+    r.repositories[r.cmdloc] = None
 
     yield r
 
+    repopool.release(r, reponame)
     r.cleanup()
     r.logout()
 
@@ -30,15 +30,19 @@ def runner():
 def orunner():
     remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
     r = Runner(False)
-    reponame = util.randrepo()
-    os.mkdir(reponame)
-    r.cdrel(reponame)
-    r.runcommand("gin", "init")
-    r.runcommand("gin", "add-remote", "--create", "--default",
-                 "origin", f"dir:{remoteloc.name}")
-    r.runcommand("gin", "upload")
 
+    def build():
+        reponame = util.randrepo()
+        os.mkdir(reponame)
+        r.cdrel(reponame)
+        r.runcommand("gin", "init")
+        r.runcommand("gin", "add-remote", "--create", "--default",
+                     "origin", f"dir:{remoteloc.name}")
+        r.runcommand("gin", "upload")
+
+    snapshot.cached(r, build, dirs=[remoteloc.name])
     r.repositories[r.cmdloc] = None
+    r.remotedir = remoteloc
 
     yield r
 
@@ -55,17 +59,38 @@ def test_all_states(runner):
 @pytest.mark.slow
 def test_all_states_offline(orunner):
     print("Using directory remote")
-    run_checks(orunner)
+    # only the offline scenario can be checkpointed (see run_checks)
+    run_checks(orunner, snapshot.Checkpoints(orunner,
+                                             [orunner.remotedir.name]))
+
+
+def run_checks(r, checkpoints=None):
+    """
+    Run the stages of the scenario one after the other. With `checkpoints`
+    (a snapshot.Checkpoints), the repository and the expected status can be
+    saved before each stage and the scenario can be resumed from any stage.
+    """
+    stages = [root_files, lock_and_modify, subdirectories, lock_subset,
+              remove_content, remove_files]
+    state = {"status": util.zerostatus()}
+    if checkpoints is None:
+        for stage in stages:
+            stage(r, state)
+    else:
+        checkpoints.run(stages, state)
+
+
+def root_files(r, state):
+    """
+    Create, commit and upload files in the root of the repository.
+    """
+    status = state["status"]
 
-
-def run_checks(r):
     # create files in root
-    for idx in range(50):
-        util.mkrandfile(f"root-{idx}.git", 5)
-    for idx in range(70, 90):
-        util.mkrandfile(f"root-{idx}.annex", 2000)
+    spec = [(f"root-{idx}.git", 5) for idx in range(50)]
+    spec += [(f"root-{idx}.annex", 2000) for idx in range(70, 90)]
+    util.mktree(spec)
 
-    status = util.zerostatus()
     status["??"] += 70
     util.assert_status(r, status=status)
 
@@ -82,6 +107,13 @@ def run_checks(r):
     # gin upload command should not have created an extra commit
     assert util.getrevcount(r) == 2
 
+
+def lock_and_modify(r, state):
+    """
+    Lock, unlock, modify and upload the root files.
+    """
+    status = state["status"]
+
     # Create more root files that will remain UNTRACKED
     for idx in "abcdef":
         util.mkrandfile(f"root-file-{idx}.untracked", 1)
@@ -105,10 +137,9 @@ def run_checks(r):
     status["TC"] += 20
     status["OK"] -= 20
     util.assert_status(r, status=status)
-    for idx in range(50):
-        util.mkrandfile(f"root-{idx}.git", 4)
-    for idx in range(70, 90):
-        util.mkrandfile(f"root-{idx}.annex", 2100)
+    spec = [(f"root-{idx}.git", 4) for idx in range(50)]
+    spec += [(f"root-{idx}.annex", 2100) for idx in range(70, 90)]
+    util.mktree(spec)
     status["OK"] = 0
     status["TC"] = 0
     status["MD"] = 70
@@ -129,14 +160,16 @@ def run_checks(r):
     # Should have 4 commits so far
     assert util.getrevcount(r) == 4
 
+
+def subdirectories(r, state):
+    """
+    Create subdirectories and upload some of their files.
+    """
+    status = state["status"]
+
     # Create some subdirectories with files
-    for idx in "abcdef":
-        dirname = f"subdir-{idx}"
-        os.mkdir(dirname)
-        r.cdrel(dirname)
-        for jdx in range(10):
-            util.mkrandfile(f"subfile-{jdx}.annex", 1500)
-        r.cdrel("..")
+    util.mktree((os.path.join(f"subdir-{idx}", f"subfile-{jdx}.annex"), 1500)
+                for idx in "abcdef" for jdx in range(10))
     status["??"] += 60
     util.assert_status(r, status=status)
 
@@ -148,7 +181,7 @@ def run_checks(r):
     status["OK"] += 12
     status["??"] -= 12
     util.assert_status(r, status=status)
-    subb = util.zerostatus()
+    subb = state["subb"] = util.zerostatus()
     subb["OK"] = 2
     subb["??"] = 8
     util.assert_status(r, path="subdir-b", status=subb)
@@ -158,6 +191,13 @@ def run_checks(r):
     for idx in "cdef":
         util.assert_status(r, path=f"subdir-{idx}", status=tenuntracked)
 
+
+def lock_subset(r, state):
+    """
+    Lock and unlock some files and a directory.
+    """
+    status = state["status"]
+
     # Lock some files
     r.runcommand("gin", "lock", "root-70.annex", "root-75.annex",
                  "root-84.annex")
@@ -197,6 +237,14 @@ def run_checks(r):
     status["NC"] = 0
     util.assert_status(r, status=status)
 
+
+def remove_content(r, state):
+    """
+    Remove annexed content, upload everything and remove all content.
+    """
+    status = state["status"]
+    subb = state["subb"]
+
     # Drop some files
     r.runcommand("gin", "rmc", os.path.join("subdir-b", "subfile-5.annex"))
     status["NC"] += 1
@@ -233,10 +281,17 @@ def run_checks(r):
     status["OK"] -= 69
     util.assert_status(r, status=status)
 
+
+def remove_files(r, state):
+    """
+    Remove files, add new ones and upload the changes.
+    """
+    status = state["status"]
+
     # remove a few files and check their status
     os.remove(os.path.join("subdir-a", "subfile-1.annex"))
     os.remove("root-10.git")
-    shutil.rmtree("subdir-b", onerror=util.force_rm)
+    util.rmtree_force("subdir-b")
     status["RM"] += 12
     status["NC"] -= 11
     status["OK"] -= 1
@@ -249,7 +304,7 @@ def run_checks(r):
     # Add new files, remove some existing ones, check status and upload
     util.mkrandfile("new-annex-file", 10021)
     util.mkrandfile("new-git-file", 10)
-    shutil.rmtree("subdir-c", onerror=util.force_rm)
+    util.rmtree_force("subdir-c")
     status["RM"] += 10
     status["??"] += 2
     status["NC"] -= 10
@@ -1,7 +1,6 @@
 """
 Test if annex filter rules work properly.
 """
-import shutil
 from runner import Runner
 import util
 import pytest
@@ -9,19 +8,19 @@ from glob import glob
 
 
 @pytest.fixture
-def runner():
+def runner(repopool):
     r = Runner()
     r.login()
 
-    reponame = util.randrepo()
-    r.runcommand("gin", "create", reponame,
-                 "Test repository for annex filtering")
+    reponame = repopool.get(r)
     r.cdrel(reponame)
-    r.repositories[r.cmdloc] = reponame
+    # deleted by the pool
+    r.repositories[r.cmdloc] = None
     r.reponame = reponame
 
     yield r
 
+    repopool.release(r, reponame)
     r.cleanup()
     r.logout()
 
@@ -35,13 +34,11 @@ def test_annex_filters(runner):
 
     r.runcommand("gin", "upload", ".")
 
-    def isannexed(fname):
-        return util.isannexed(r, fname)
-
     # annexed files should include path to annex objects in their git blob
+    annexedfiles = util.annexed(r)
     for idx in range(3):
         fname = f"randfile{idx}"
-        assert isannexed(fname)
+        assert annexedfiles[fname]
 
     # Create markdown, python, and 'foo' file
     # All these are extensions that are excluded from annex in the config
@@ -51,19 +48,20 @@ def test_annex_filters(runner):
         util.mkrandfile(fname, 500)
 
     r.runcommand("gin", "upload", *excludedfiles)
+    annexedfiles = util.annexed(r, excludedfiles)
     for fname in excludedfiles:
-        assert not isannexed(fname)
+        assert not annexedfiles[fname]
 
     # make a really big "script"
     util.mkrandfile("bigscript.py", 100000)  # 100 MB
     r.runcommand("ls", "-lh")
     r.runcommand("gin", "upload", "bigscript.py")
-    assert not isannexed("bigscript.py")
+    assert not util.isannexed(r, "bigscript.py")
 
     # clear local directory and reclone
     r.runcommand("gin", "annex", "uninit", exit=False)
     r.cdrel("..")
-    shutil.rmtree(r.reponame, onerror=util.force_rm)
+    util.rmtree_force(r.reponame)
 
     repopath = f"{r.username}/{r.reponame}"
     r.runcommand("gin", "get", repopath)
@@ -75,8 +73,11 @@ def test_annex_filters(runner):
     status["NC"] = 3
     util.assert_status(r, status=status)
 
+    annexedfiles = util.annexed(r)
     for fname in glob("randfile*"):
-        assert isannexed(fname)
+        assert annexedfiles[fname]
+    for fname in excludedfiles + ["bigscript.py"]:
+        assert not annexedfiles[fname]
 
     # download first rand file
     r.runcommand("gin", "get-content", "randfile1")
@@ -0,0 +1,81 @@
+"""
+Benchmark of `gin commit .` and `gin upload` (to a dir: remote) throughput
+for different numbers of files, file size distributions and directory
+layouts. The distributions include sizes around the annex threshold of the
+test configuration (minsize: 50kB).
+"""
+import os
+import tempfile
+from runner import Runner
+import util
+import bench
+import pytest
+
+
+# file sizes in kB, assigned to the files in turn
+DISTRIBUTIONS = {
+    "small": (4,),
+    "threshold": (40, 45, 49, 50, 51, 55, 60),
+    "large": (1024,),
+    "mixed": (1, 10, 100, 1000),
+}
+
+# directory layouts as (depth, fanout)
+LAYOUTS = {
+    "flat": (0, 0),
+    "deep": (4, 4),
+}
+
+
+@pytest.fixture
+def runner():
+    remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
+    r = Runner(False)
+    reponame = util.randrepo()
+    os.mkdir(reponame)
+    r.cdrel(reponame)
+    r.runcommand("gin", "init")
+    r.runcommand("gin", "add-remote", "--create", "--default",
+                 "origin", f"dir:{remoteloc.name}")
+    r.repositories[r.cmdloc] = None
+
+    yield r
+
+    r.cleanup()
+
+
+@pytest.mark.benchmark
+@pytest.mark.offline
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("distribution", DISTRIBUTIONS)
+@pytest.mark.parametrize("nfiles", bench.nfiles(100, 1000, 10000, 100000))
+def test_bench_commit(runner, nfiles, distribution, layout):
+    r = runner
+    sizes = DISTRIBUTIONS[distribution]
+    depth, fanout = LAYOUTS[layout]
+    spec = [(path, sizes[idx % len(sizes)])
+            for idx, path in enumerate(bench.paths(nfiles, depth, fanout,
+                                                   ext=".dat"))]
+    totalkb = sum(size for _, size in spec)
+    bench.skiplarge(totalkb)
+    util.mktree(spec)
+
+    params = {"nfiles": nfiles, "distribution": distribution,
+              "layout": layout, "totalbytes": totalkb * 1024}
+    _, measurement = bench.measure(r, "gin", "commit", ".")
+    nannexed = sum(util.annexed(r).values())
+    bench.record(r, "commit", nannexed=nannexed,
+                 filespersec=nfiles / measurement["duration"],
+                 mbpersec=totalkb / 1024 / measurement["duration"],
+                 **params, **measurement)
+
+    _, measurement = bench.measure(r, "gin", "upload")
+    bench.record(r, "upload", nannexed=nannexed,
+                 filespersec=nfiles / measurement["duration"],
+                 mbpersec=totalkb / 1024 / measurement["duration"],
+                 **params, **measurement)
+
+    # everything was committed and uploaded
+    status = util.zerostatus()
+    status["OK"] = nfiles
+    util.assert_status(r, status=status)
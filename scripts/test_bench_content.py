@@ -0,0 +1,134 @@
+"""
+Benchmark of cloning a repository and retrieving its annexed content from
+a dir: remote and from the test server: time to clone, time to get the
+content of the first file, and the throughput of getting the content of a
+directory (selective) and of the whole tree with `gin get-content` and
+`gin download --content`.
+"""
+import os
+import tempfile
+from runner import Runner
+import util
+import bench
+import pytest
+
+
+REMOTES = [pytest.param("dir", marks=pytest.mark.offline),
+           pytest.param("server")]
+
+
+@pytest.fixture
+def runners(request, remote):
+    """
+    A runner with a repository connected to the remote and a second runner
+    for cloning it.
+    """
+    if remote == "server":
+        repopool = request.getfixturevalue("repopool")
+        src = Runner(chdir=False)
+        src.login()
+        reponame = repopool.get(src)
+        src.cdrel(reponame)
+        # deleted by the pool
+        src.repositories[src.cmdloc] = None
+        dest = Runner(chdir=False, server=src.server)
+        dest.login()
+    else:
+        remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
+        src = Runner(False, chdir=False)
+        reponame = util.randrepo()
+        os.mkdir(src.path(reponame))
+        src.cdrel(reponame)
+        src.runcommand("gin", "init")
+        src.runcommand("gin", "add-remote", "--create", "--default",
+                       "origin", f"dir:{remoteloc.name}")
+        src.repositories[src.cmdloc] = None
+        src.remotedir = remoteloc
+        dest = Runner(False, chdir=False)
+    src.reponame = reponame
+
+    yield src, dest
+
+    if remote == "server":
+        repopool.release(src, reponame)
+    src.cleanup()
+    src.logout()
+    dest.cleanup()
+    dest.logout()
+
+
+def clone(src, dest, remote):
+    """
+    Clone the repository of `src` without content. Returns the measurements
+    of the clone commands.
+    """
+    measurements = list()
+    if remote == "server":
+        _, measurement = bench.measure(dest, "gin", "get",
+                                       f"{src.username}/{src.reponame}")
+        measurements.append(measurement)
+        dest.cdrel(src.reponame)
+    else:
+        os.mkdir(dest.path(src.reponame))
+        dest.cdrel(src.reponame)
+        for args in (("gin", "init"),
+                     ("gin", "add-remote", "--default", "origin",
+                      f"dir:{src.remotedir.name}"),
+                     ("gin", "download")):
+            _, measurement = bench.measure(dest, *args)
+            measurements.append(measurement)
+    dest.repositories[dest.cmdloc] = None
+    return measurements
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", (100, 10240))
+@pytest.mark.parametrize("nannex", bench.nfiles(10, 100, 1000))
+@pytest.mark.parametrize("remote", REMOTES)
+def test_bench_content(runners, remote, nannex, size):
+    src, dest = runners
+    bench.skiplarge(nannex * size)
+
+    # annexed files in 10 directories
+    fnames = bench.paths(nannex, 1, 10, ext=".dat")
+    util.mktree([(fname, size) for fname in fnames], root=src.cmdloc)
+    src.runcommand("gin", "commit", ".")
+    src.runcommand("gin", "upload")
+
+    params = {"remote": remote, "nannex": nannex, "size": size}
+
+    def recordrate(benchmark, nfiles, measurement):
+        mb = nfiles * size / 1024
+        bench.record(dest, benchmark, nfiles=nfiles,
+                     mbpersec=mb / measurement["duration"],
+                     **params, **measurement)
+
+    measurements = clone(src, dest, remote)
+    bench.record(dest, "clone", steps=measurements,
+                 duration=sum(m["duration"] for m in measurements),
+                 **params)
+
+    # content of the first file only
+    _, measurement = bench.measure(dest, "gin", "get-content", fnames[0])
+    recordrate("first-file", 1, measurement)
+
+    # content of one of the directories
+    subdir = os.path.dirname(fnames[0])
+    nsubdir = len([fname for fname in fnames
+                   if os.path.dirname(fname) == subdir])
+    dest.runcommand("gin", "rmc", ".")
+    _, measurement = bench.measure(dest, "gin", "get-content", subdir)
+    recordrate("get-content-dir", nsubdir, measurement)
+
+    # whole tree
+    dest.runcommand("gin", "rmc", ".")
+    _, measurement = bench.measure(dest, "gin", "get-content", ".")
+    recordrate("get-content-all", nannex, measurement)
+
+    dest.runcommand("gin", "rmc", ".")
+    _, measurement = bench.measure(dest, "gin", "download", "--content")
+    recordrate("download-content", nannex, measurement)
+
+    status = util.zerostatus()
+    status["OK"] = nannex
+    util.assert_status(dest, status=status)
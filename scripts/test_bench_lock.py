@@ -0,0 +1,62 @@
+"""
+Benchmark of `gin lock` and `gin unlock` on trees of large annexed files.
+Records the duration and the bytes written to disk by each operation
+(relative to the size of the annexed content, so copies of the content
+show up as a ratio of 1 or more), the number of files in the TC state
+afterwards, and the number of unlocked files that share their data with
+the annex object (hardlinks) instead of being copies.
+"""
+import os
+from runner import Runner
+import util
+import bench
+import pytest
+
+
+@pytest.fixture
+def runner():
+    r = Runner(False)
+    reponame = util.randrepo()
+    os.mkdir(reponame)
+    r.cdrel(reponame)
+    r.runcommand("gin", "init")
+    r.repositories[r.cmdloc] = None
+
+    yield r
+
+    r.cleanup()
+
+
+def countlinked(fnames):
+    """
+    Number of files that have more than one hard link.
+    """
+    return sum(1 for fname in fnames
+               if not os.path.islink(fname) and os.stat(fname).st_nlink > 1)
+
+
+@pytest.mark.benchmark
+@pytest.mark.offline
+@pytest.mark.parametrize("size", (1024, 10240, 204800))
+@pytest.mark.parametrize("nfiles", bench.nfiles(1, 10, 100))
+def test_bench_lock(runner, nfiles, size):
+    r = runner
+    totalkb = nfiles * size
+    bench.skiplarge(totalkb)
+
+    fnames = bench.paths(nfiles, 1, 10, ext=".dat")
+    util.mktree((fname, size) for fname in fnames)
+    r.runcommand("gin", "commit", ".")
+
+    params = {"nfiles": nfiles, "size": size, "totalbytes": totalkb * 1024}
+    for command in ("lock", "unlock"):
+        _, measurement = bench.measure(r, "gin", command, ".")
+        counts = util.statuscounts(util.lsstatus(r))
+        written = measurement.get("write_bytes")
+        bench.record(r, command, tc=counts["TC"],
+                     writeratio=(written / (totalkb * 1024)
+                                 if written is not None else None),
+                     linked=countlinked(fnames), **params, **measurement)
+        assert counts["TC"] == nfiles
+        # commit the type change
+        r.runcommand("gin", "commit", ".")
@@ -0,0 +1,91 @@
+"""
+Benchmark of `gin ls` (plain, --short and --json) on the root and a
+subdirectory of repositories with increasing numbers of files in all
+states, for different directory layouts.
+"""
+import os
+from runner import Runner
+import util
+import bench
+import pytest
+
+
+# directory layouts as (depth, fanout)
+LAYOUTS = {
+    "flat": (0, 0),
+    "wide": (1, 100),
+    "deep": (5, 3),
+}
+
+# fractions of the files in each state: committed git files (OK), committed
+# annexed files (OK), locked (TC), content dropped (NC) and untracked (??)
+STATES = (("OK", 0.4), ("OK", 0.3), ("TC", 0.1), ("NC", 0.1), ("??", 0.1))
+
+
+@pytest.fixture
+def runner():
+    r = Runner(False)
+    reponame = util.randrepo()
+    os.mkdir(reponame)
+    r.cdrel(reponame)
+    r.runcommand("gin", "init")
+    bench.writeconfig(r)
+    r.runcommand("gin", "commit", "config.yml")
+    r.repositories[r.cmdloc] = None
+
+    yield r
+
+    r.cleanup()
+
+
+def mkrepo(r, nfiles, depth, fanout):
+    """
+    Create and commit `nfiles` 1 kB files and bring them into the states in
+    STATES. Returns the expected status counts.
+    """
+    groups = list()
+    for idx, (_, fraction) in enumerate(STATES):
+        ext = ".md" if idx == 0 else ".dat"  # .md files go to git
+        groups.append(bench.paths(int(nfiles * fraction), depth, fanout,
+                                  prefix=f"file{idx}", ext=ext))
+    ok, annexed, locked, dropped, untracked = groups
+
+    util.mktree((path, 1) for path in ok + annexed + locked + dropped)
+    r.runcommand("gin", "commit", ".")
+    bench.runchunked(r, ("gin", "lock"), locked)
+    bench.runchunked(r, ("git", "annex", "drop", "--force"), dropped)
+    util.mktree((path, 1) for path in untracked)
+
+    status = util.zerostatus()
+    for (code, _), group in zip(STATES, groups):
+        status[code] += len(group)
+    return status
+
+
+@pytest.mark.benchmark
+@pytest.mark.offline
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("nfiles", bench.nfiles(1000, 10000, 100000,
+                                                1000000))
+def test_bench_ls(runner, nfiles, layout):
+    r = runner
+    depth, fanout = LAYOUTS[layout]
+    status = mkrepo(r, nfiles, depth, fanout)
+
+    locations = {"root": "."}
+    if depth:
+        locations["subdir"] = "dir-0-0"
+    for location, path in locations.items():
+        for flags in ((), ("--short",), ("--json",)):
+            result, measurement = bench.measure(r, "gin", "ls", *flags,
+                                                path)
+            bench.record(r, "ls", nfiles=nfiles, layout=layout,
+                         location=location, **measurement)
+            if flags == ("--short",) and location == "root":
+                statmap = dict()
+                for line in result.stdout.decode("utf-8").splitlines():
+                    if line:
+                        code, fname = line.split(" ", 1)
+                        statmap[fname] = code
+                statmap.pop("config.yml", None)
+                assert util.statuscounts(statmap) == status
@@ -0,0 +1,113 @@
+"""
+Benchmark of `gin version` on histories of increasing length: restoring a
+revision by ID and by selection from the list, and copying single files,
+directories and whole trees from an old revision with --copy-to.
+
+The history is synthesised with `git fast-import` on top of an initial gin
+commit with annexed files, changing a fixed fraction of the git files in
+each commit, so the cost of each operation can be compared for the same
+number of changed files and different history lengths.
+"""
+import os
+import tempfile
+from runner import Runner
+import util
+import bench
+import pytest
+
+
+# files changed in each synthesised commit, as fractions of NTEXT
+CHANGERATES = {
+    "low": 0.01,
+    "high": 0.5,
+}
+
+# git files in 10 directories changed by the synthesised history
+NTEXT = 200
+# annexed files (100 kB) from the initial commit
+NANNEX = 10
+
+
+@pytest.fixture
+def runner():
+    remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
+    r = Runner(False)
+    reponame = util.randrepo()
+    os.mkdir(reponame)
+    r.cdrel(reponame)
+    r.runcommand("gin", "init")
+    r.runcommand("gin", "add-remote", "--create", "--default",
+                 "origin", f"dir:{remoteloc.name}")
+    r.repositories[r.cmdloc] = None
+
+    yield r
+
+    r.cleanup()
+
+
+def synthesise(r, ncommits, rate):
+    """
+    Add `ncommits` commits to the current branch with `git fast-import`.
+    Each commit rewrites int(rate * NTEXT) of the git files, in turn.
+    """
+    branch, _ = r.runcommand("git", "symbolic-ref", "HEAD")
+    textfiles = bench.paths(NTEXT, 1, 10, prefix="text", ext=".md")
+    nchanged = max(int(rate * NTEXT), 1)
+    stream = list()
+    fidx = 0
+    for cidx in range(ncommits):
+        message = f"Synthesised commit {cidx}"
+        stream.append(f"commit {branch}\n"
+                      f"committer Bench <bench@example.com> "
+                      f"{1500000000 + cidx} +0000\n"
+                      f"data {len(message)}\n{message}\n")
+        if cidx == 0:
+            stream.append(f"from {branch}^0\n")
+        for _ in range(nchanged):
+            content = f"{textfiles[fidx]} changed in commit {cidx}\n"
+            stream.append(f"M 100644 inline {textfiles[fidx]}\n"
+                          f"data {len(content)}\n{content}")
+            fidx = (fidx + 1) % NTEXT
+        stream.append("\n")
+    r.runcommand("git", "fast-import", "--quiet", inp="".join(stream))
+    r.runcommand("git", "reset", "--hard")
+
+
+@pytest.mark.benchmark
+@pytest.mark.offline
+@pytest.mark.parametrize("changerate", CHANGERATES)
+@pytest.mark.parametrize("ncommits", bench.ncommits(100, 1000, 10000))
+def test_bench_version(runner, ncommits, changerate):
+    r = runner
+    spec = [(path, 1) for path in bench.paths(NTEXT, 1, 10, prefix="text",
+                                              ext=".md")]
+    spec += [(f"data-{idx}.dat", 100) for idx in range(NANNEX)]
+    util.mktree(spec)
+    r.runcommand("gin", "commit", ".")
+    r.runcommand("gin", "upload")
+    synthesise(r, ncommits, CHANGERATES[changerate])
+    assert util.getrevcount(r) == ncommits + 2
+
+    params = {"ncommits": ncommits, "changerate": changerate}
+    middle = f"HEAD~{ncommits // 2}"
+
+    # copy files from an old revision (no new commits)
+    copies = {"file": ["dir-0-0/text-0.md"], "directory": ["dir-0-1"],
+              "tree": ["."]}
+    for target, paths in copies.items():
+        _, measurement = bench.measure(r, "gin", "version", "--id", middle,
+                                       "--copy-to", f"copy-{target}",
+                                       *paths)
+        bench.record(r, "version-copyto", target=target, **params,
+                     **measurement)
+
+    # select the second newest revision from the full list
+    _, measurement = bench.measure(r, "gin", "version", "--max-count", "0",
+                                   inp="2")
+    bench.record(r, "version-select", **params, **measurement)
+
+    # restore revisions at different depths
+    for depth in (1, ncommits // 2, ncommits):
+        _, measurement = bench.measure(r, "gin", "version", "--id",
+                                       f"HEAD~{depth}")
+        bench.record(r, "version-id", depth=depth, **params, **measurement)
@@ -6,20 +6,19 @@ import yaml
 
 
 @pytest.fixture
-def runner():
+def runner(repopool):
     r = Runner()
     r.login()
-    # create repo (remote and local) and cd into directory
-    reponame = util.randrepo()
-    print("Setting up test repository")
-    r.runcommand("gin", "create", reponame,
-                 "Test repository for cascading configurations")
+    # get a new repo and cd into directory
+    reponame = repopool.get(r)
     r.reponame = reponame
     r.cdrel(reponame)
-    r.repositories[r.cmdloc] = reponame
+    # deleted by the pool
+    r.repositories[r.cmdloc] = None
 
     yield r
 
+    repopool.release(r, reponame)
     r.cleanup()
     r.logout()
 
@@ -42,19 +41,21 @@ def test_config_path(runner):
     # small files should now be added to annex
     util.mkrandfile("smallfile", 1)
     r.runcommand("gin", "upload", "smallfile")
-    # smallfile should be annexed
-    assert util.isannexed(r, "smallfile")
 
     # .md file should still be excluded because of the exclusion rule in the
     # global configuration
     util.mkrandfile("anotherfile.md", 10)
     r.runcommand("gin", "upload", "anotherfile.md")
-    # anotherfile.md should not be a symlink
-    assert not util.isannexed(r, "anotherfile.md")
 
     # config file should never be added to annex
     r.runcommand("gin", "upload", "config.yml")
-    assert not util.isannexed(r, "config.yml")
+
+    annexedfiles = util.annexed(r)
+    # smallfile should be annexed
+    assert annexedfiles["smallfile"]
+    # anotherfile.md should not be a symlink
+    assert not annexedfiles["anotherfile.md"]
+    assert not annexedfiles["config.yml"]
 
     # changing gitannex binary in local configuration should have no effect
     conf["bin"] = {"gitannex": "ls"}
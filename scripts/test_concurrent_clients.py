@@ -0,0 +1,95 @@
+"""
+Several clients working on one server repository at the same time, with
+their commands run concurrently through AsyncRunner: cloning, getting
+content, uploading (where all but one upload may be rejected until the
+client downloads the others' changes) and downloading.
+"""
+from runner import AsyncRunner, runall
+import util
+import pytest
+
+
+NCLIENTS = 3
+
+uperrmsg = ("upload failed: changes were made on the server that have not "
+            "been downloaded; run 'gin download' to update local copies")
+
+
+@pytest.fixture
+def clients(repopool):
+    owner = AsyncRunner(chdir=False)
+    owner.login()
+    reponame = repopool.get(owner)
+    owner.cdrel(reponame)
+    # deleted by the pool
+    owner.repositories[owner.cmdloc] = None
+    owner.reponame = reponame
+
+    clients = [owner]
+    for _ in range(NCLIENTS - 1):
+        r = AsyncRunner(chdir=False, server=owner.server)
+        r.login()
+        r.reponame = reponame
+        clients.append(r)
+
+    yield clients
+
+    repopool.release(owner, reponame)
+    for r in clients:
+        r.cleanup()
+        r.logout()
+
+
+def assert_files(r, manifest):
+    status = util.zerostatus()
+    status["OK"] = len(manifest)
+    util.assert_status(r, status=status)
+    for path, spec in manifest.items():
+        assert util.md5sum(r.path(path)) == spec.digest
+
+
+def test_concurrent_clients(clients):
+    owner, others = clients[0], clients[1:]
+    repopath = f"{owner.username}/{owner.reponame}"
+
+    # annexed and git files from the owner
+    manifest = util.mktree([(f"owner/data-{idx}.dat", 100)
+                            for idx in range(5)] +
+                           [(f"owner/notes-{idx}.md", 5)
+                            for idx in range(5)],
+                           root=owner.cmdloc)
+    owner.runcommand("gin", "upload", ".")
+
+    # clone and get content on all other clients at the same time
+    runall(*(r.aruncommand("gin", "get", repopath) for r in others))
+    for r in others:
+        r.cdrel(r.reponame)
+        r.repositories[r.cmdloc] = None
+    runall(*(r.aruncommand("gin", "get-content", ".") for r in others))
+    for r in others:
+        assert_files(r, manifest)
+
+    # every client commits new files in its own directory and they all
+    # upload at the same time
+    for idx, r in enumerate(clients):
+        manifest.update(util.mktree([(f"client{idx}/data.dat", 200),
+                                     (f"client{idx}/notes.md", 5)],
+                                    root=r.cmdloc))
+    runall(*(r.aruncommand("gin", "commit", ".") for r in clients))
+    results = runall(*(r.arun("gin", "upload", exit=False)
+                       for r in clients))
+
+    # at least one upload goes through; the others must download the new
+    # commits first
+    assert any(result.returncode == 0 for result in results)
+    for r, result in zip(clients, results):
+        if result.returncode:
+            assert result.stderr, "Expected error, got nothing"
+            assert result.stdout.strip().endswith(uperrmsg)
+            r.runcommand("gin", "download")
+            r.runcommand("gin", "upload")
+
+    # all clients download everything at the same time
+    runall(*(r.aruncommand("gin", "download", "--content") for r in clients))
+    for r in clients:
+        assert_files(r, manifest)
@@ -17,9 +17,9 @@ acferrmsg = ("files changed locally and remotely and the conflict was "
 
 def server_remotes():
     # Use 2 runner instances to checkout two clones and create merge conflicts
-    loca = Runner()
+    loca = Runner(chdir=False)
     loca.login()
-    locb = Runner()
+    locb = Runner(chdir=False)
     locb.env = loca.env  # share environments between the two users
 
     # create repo (remote and local) and cd into directory
@@ -42,10 +42,10 @@ def server_remotes():
 
 def dir_remotes(remoteloc):
     # Use 2 runner instances to checkout two clones and create merge conflicts
-    loca = Runner(False)
+    loca = Runner(False, chdir=False)
 
     reponame = util.randrepo()
-    os.mkdir(reponame)
+    os.mkdir(loca.path(reponame))
     loca.cdrel(reponame)
 
     # Create repo in A
@@ -56,8 +56,8 @@ def dir_remotes(remoteloc):
     loca.repositories[loca.cmdloc] = None
 
     # Init in B and download
-    locb = Runner(False)
-    os.mkdir(reponame)
+    locb = Runner(False, chdir=False)
+    os.mkdir(locb.path(reponame))
     locb.cdrel(reponame)
     locb.runcommand("gin", "init")
     locb.runcommand("gin", "add-remote", "--default",
@@ -91,29 +91,25 @@ def _untracked_conflict(runner, size):
     loca, locb = runner
 
     fname = "dl_over_untracked"
-    loca.cdrel()
-    util.mkrandfile(fname, size)
-    hasha = util.md5sum(fname)
+    hasha = util.mkrandfile(loca.path(fname), size)
     loca.runcommand("gin", "upload", fname)
 
-    locb.cdrel()
-    util.mkrandfile(fname, size+(size//10))
-    hashb = util.md5sum(fname)
+    hashb = util.mkrandfile(locb.path(fname), size+(size//10))
     out, err = locb.runcommand("gin", "download", exit=False)
     assert err, "Expected error, got nothing"
     assert owerrmsg in err
     assert err.endswith(fname)
 
     # resolution: rename untracked file and download
-    locb.cdrel()
-    os.rename(fname, fname+".bak")
+    os.rename(locb.path(fname), locb.path(fname+".bak"))
     locb.runcommand("gin", "download")
 
     # both files are in directory now
     # check if the hashes match
     locb.runcommand("gin", "getc", ".")
-    allfiles = os.listdir()
-    hashes = [util.md5sum(f) for f in allfiles if f.startswith(fname)]
+    allfiles = os.listdir(locb.path())
+    hashes = [util.md5sum(locb.path(f))
+              for f in allfiles if f.startswith(fname)]
     assert sorted(hashes) == sorted([hasha, hashb])
 
 
@@ -136,14 +132,10 @@ def _tracked_conflict(runner, sizea, sizeb):
     experr = acferrmsg if annexed else cferrmsg
 
     fname = "dl_over_tracked"
-    loca.cdrel()
-    util.mkrandfile(fname, sizea)
+    hasha = util.mkrandfile(loca.path(fname), sizea)
     loca.runcommand("gin", "upload", fname)
-    hasha = util.md5sum(fname)
 
-    locb.cdrel()
-    util.mkrandfile(fname, sizeb)
-    hashb = util.md5sum(fname)
+    hashb = util.mkrandfile(locb.path(fname), sizeb)
     locb.runcommand("gin", "commit", fname)
     out, err = locb.runcommand("gin", "download", exit=False)
     assert err, "Expected error, got nothing"
@@ -151,17 +143,17 @@ def _tracked_conflict(runner, sizea, sizeb):
 
     if not annexed:
         # resolution: rename file and sync
-        locb.cdrel()
-        os.rename(fname, fname+".bak")
+        os.rename(locb.path(fname), locb.path(fname+".bak"))
         locb.runcommand("gin", "sync")
-        assert hasha == util.md5sum(fname)
-        assert hashb == util.md5sum(fname+".bak")
+        assert hasha == util.md5sum(locb.path(fname))
+        assert hashb == util.md5sum(locb.path(fname+".bak"))
     else:
         # both files are in directory now
         # check if the hashes match
         locb.runcommand("gin", "getc", ".")
-        allfiles = os.listdir()
-        hashes = [util.md5sum(f) for f in allfiles if f.startswith(fname)]
+        allfiles = os.listdir(locb.path())
+        hashes = [util.md5sum(locb.path(f))
+                  for f in allfiles if f.startswith(fname)]
         assert sorted(hashes) == sorted([hasha, hashb])
 
 
@@ -190,31 +182,28 @@ def test_download_text_over_text(runner):
     loca, locb = runner
 
     fname = "text_over_text"
-    loca.cdrel()
-    with open(fname, "w") as txtfile:
+    with open(loca.path(fname), "w") as txtfile:
         txtfile.write("I AM A")
     loca.runcommand("gin", "upload", fname)
 
-    locb.cdrel()
-    with open(fname, "w") as txtfile:
+    with open(locb.path(fname), "w") as txtfile:
         txtfile.write("I AM B")
     locb.runcommand("gin", "commit", fname)
     out, err = locb.runcommand("gin", "download", exit=False)
-    with open(fname, "r") as txtfile:
+    with open(locb.path(fname), "r") as txtfile:
         print(txtfile.read())
     assert err, "Expected error, got nothing"
     assert cferrmsg in err
     assert err.endswith(fname)
 
     # resolution: rename file and sync
-    locb.cdrel()
-    os.rename(fname, fname+".bak")
+    os.rename(locb.path(fname), locb.path(fname+".bak"))
     locb.runcommand("gin", "annex", "sync")
 
     # make sure the files haven't changed
-    with open(fname) as txtfile:
+    with open(locb.path(fname)) as txtfile:
         assert txtfile.read() == "I AM A"
-    with open(fname+".bak") as txtfile:
+    with open(locb.path(fname+".bak")) as txtfile:
         assert txtfile.read() == "I AM B"
 
 
@@ -222,11 +211,9 @@ def test_download_text_over_text(runner):
 def test_push_conflict(runner):
     loca, locb = runner
 
-    loca.cdrel()
-    util.mkrandfile("newfile.git", 1)
+    util.mkrandfile(loca.path("newfile.git"), 1)
     loca.runcommand("gin", "upload", "newfile.git")
-    locb.cdrel()
-    util.mkrandfile("newfile-b.git", 1)
+    util.mkrandfile(locb.path("newfile-b.git"), 1)
     out, err = locb.runcommand("gin", "upload", "newfile-b.git", exit=False)
     assert err, "Expected error, got nothing"
     assert out.endswith(uperrmsg)
@@ -8,19 +8,19 @@ import pytest
 
 
 @pytest.fixture
-def runner():
+def runner(repopool):
     r = Runner()
     r.login()
 
-    reponame = util.randrepo()
-    r.runcommand("gin", "create", reponame,
-                 "Test repository for multi add annex")
+    reponame = repopool.get(r)
     r.cdrel(reponame)
-    r.repositories[r.cmdloc] = reponame
+    # deleted by the pool
+    r.repositories[r.cmdloc] = None
     r.reponame = reponame
 
     yield r
 
+    repopool.release(r, reponame)
     r.cleanup()
     r.logout()
 
@@ -36,8 +36,9 @@ def test_annex_filters(runner):
     r.runcommand("gin", "upload", ".")
 
     # files should be links
+    annexedfiles = util.annexed(r)
     for idx in range(N):
-        util.isannexed(r, f"randfile{idx}")
+        assert annexedfiles[f"randfile{idx}"]
 
     status = util.zerostatus()
     status["OK"] = N
@@ -15,10 +15,10 @@ correct md5 hashes
 """
 import os
 import tempfile
-import shutil
 from glob import glob
 from runner import Runner
 import util
+import snapshot
 import pytest
 
 
@@ -34,19 +34,19 @@ def hashfiles():
 
 
 @pytest.fixture
-def runner():
+def runner(repopool):
     r = Runner()
     r.login()
 
-    reponame = util.randrepo()
-    r.runcommand("gin", "create", reponame,
-                 "Test a minimal workflow")
+    reponame = repopool.get(r)
     r.reponame = reponame
     r.cdrel(reponame)
-    r.repositories[r.cmdloc] = reponame
+    # deleted by the pool
+    r.repositories[r.cmdloc] = None
 
     yield r
 
+    repopool.release(r, reponame)
     r.cleanup()
     r.logout()
 
@@ -56,16 +56,20 @@ def drunner():
     remoteloc = tempfile.TemporaryDirectory(prefix="gin-cli-test")
     r = Runner(False)
 
-    reponame = util.randrepo()
-    r.reponame = reponame
-    os.mkdir(reponame)
-    r.cdrel(reponame)
+    def build():
+        reponame = util.randrepo()
+        os.mkdir(reponame)
+        r.cdrel(reponame)
 
-    # Create repo in A
-    r.runcommand("gin", "init")
-    r.runcommand("gin", "add-remote", "--create", "--default",
-                 "origin", f"dir:{remoteloc.name}")
-    r.runcommand("gin", "upload")
+        # Create repo in A
+        r.runcommand("gin", "init")
+        r.runcommand("gin", "add-remote", "--create", "--default",
+                     "origin", f"dir:{remoteloc.name}")
+        r.runcommand("gin", "upload")
+        return {"reponame": reponame}
+
+    state = snapshot.cached(r, build, dirs=[remoteloc.name])
+    r.reponame = state["reponame"]
     r.repositories[r.cmdloc] = None
     r.remotedir = remoteloc
 
@@ -93,7 +97,7 @@ def test_workflow(runner):
     # cleanup local repository
     r.runcommand("gin", "annex", "uninit", exit=False)
     r.cdrel("..")
-    shutil.rmtree(r.reponame, onerror=util.force_rm)
+    util.rmtree_force(r.reponame)
 
     # redownload and check the hashes
     repopath = f"{r.username}/{r.reponame}"
@@ -107,15 +111,16 @@ def test_workflow(runner):
     util.assert_status(r, status=status)
 
     curhashes = hashfiles()
+    annexedfiles = util.annexed(r)
     for k in curhashes:
         orig = orighashes[k]
         cur = curhashes[k]
         if k.endswith("git"):
             assert orig == cur
-            assert not util.isannexed(r, k)
+            assert not annexedfiles[k]
         elif k.endswith("annex"):
             assert orig != cur
-            assert util.isannexed(r, k)
+            assert annexedfiles[k]
         else:
             assert False, f"Unexpected file {k}"
 
@@ -161,7 +166,7 @@ def test_workflow_offline(drunner):
     # cleanup local repository
     r.runcommand("gin", "annex", "uninit", exit=False)
     r.cdrel("..")
-    shutil.rmtree(r.reponame, onerror=util.force_rm)
+    util.rmtree_force(r.reponame)
 
     # redownload and check the hashes
     os.mkdir(r.reponame)
@@ -178,15 +183,16 @@ def test_workflow_offline(drunner):
     util.assert_status(r, status=status)
 
     curhashes = hashfiles()
+    annexedfiles = util.annexed(r)
     for k in curhashes:
         orig = orighashes[k]
         cur = curhashes[k]
         if k.endswith("git"):
             assert orig == cur
-            assert not util.isannexed(r, k)
+            assert not annexedfiles[k]
         elif k.endswith("annex"):
             assert orig != cur
-            assert util.isannexed(r, k)
+            assert annexedfiles[k]
         else:
             assert False, f"Unexpected file {k}"
 
@@ -1,7 +1,7 @@
 import os
-import shutil
 from runner import Runner
 import util
+import snapshot
 import pytest
 import json
 import socket
@@ -31,17 +31,29 @@ def test_local_only(runner):
     r.runcommand("gin", "init")
     r.repositories[r.cmdloc] = None
 
-    ngit = 15
-    nannex = 10
-    nuntracked = 5
+    # the repository has no remotes, so it can be checkpointed
+    state = {"status": util.zerostatus(),
+             "ngit": 15, "nannex": 10, "nuntracked": 5}
+    snapshot.Checkpoints(r).run([local_commit, local_modify,
+                                 local_subdirectories, local_remove], state)
+
+    print("Done!")
+
+
+def local_commit(r, state):
+    """
+    Create and commit files; uploading fails without a remote.
+    """
+    status = state["status"]
+    ngit = state["ngit"]
+    nannex = state["nannex"]
+    nuntracked = state["nuntracked"]
 
     # create files in root
-    for idx in range(ngit):
-        util.mkrandfile(f"root-{idx}.git", 1)
-    for idx in range(nannex):
-        util.mkrandfile(f"root-{idx}.annex", 100)
+    spec = [(f"root-{idx}.git", 1) for idx in range(ngit)]
+    spec += [(f"root-{idx}.annex", 100) for idx in range(nannex)]
+    util.mktree(spec)
 
-    status = util.zerostatus()
     status["??"] = nannex + ngit
     util.assert_status(r, status=status)
 
@@ -76,11 +88,19 @@ def test_local_only(runner):
     # gin upload command should not have created an extra commit
     assert util.getrevcount(r) == 3
 
+
+def local_modify(r, state):
+    """
+    Modify and commit all tracked files.
+    """
+    status = state["status"]
+    ngit = state["ngit"]
+    nannex = state["nannex"]
+
     # modify all tracked files
-    for idx in range(ngit):
-        util.mkrandfile(f"root-{idx}.git", 4)
-    for idx in range(nannex):
-        util.mkrandfile(f"root-{idx}.annex", 2100)
+    spec = [(f"root-{idx}.git", 4) for idx in range(ngit)]
+    spec += [(f"root-{idx}.annex", 2100) for idx in range(nannex)]
+    util.mktree(spec)
     status["LC"] -= ngit + nannex
     status["MD"] += ngit + nannex
     util.assert_status(r, status=status)
@@ -94,14 +114,16 @@ def test_local_only(runner):
     # Should have 4 commits so far
     assert util.getrevcount(r) == 4
 
+
+def local_subdirectories(r, state):
+    """
+    Create subdirectories and commit some of their files.
+    """
+    status = state["status"]
+
     # Create some subdirectories with files
-    for idx in "abcdef":
-        dirname = f"subdir-{idx}"
-        os.mkdir(dirname)
-        r.cdrel(dirname)
-        for jdx in range(10):
-            util.mkrandfile(f"subfile-{jdx}.annex", 1500)
-        r.cdrel("..")
+    util.mktree((os.path.join(f"subdir-{idx}", f"subfile-{jdx}.annex"), 1500)
+                for idx in "abcdef" for jdx in range(10))
     status["??"] += 60
     util.assert_status(r, status=status)
 
@@ -124,10 +146,17 @@ def test_local_only(runner):
     status["NC"] = 0
     util.assert_status(r, status=status)
 
+
+def local_remove(r, state):
+    """
+    Remove files, commit deletions and add new files.
+    """
+    status = state["status"]
+
     # Remove a few file and check their status
     os.remove("subdir-f/subfile-1.annex")
     os.remove("root-10.git")
-    shutil.rmtree("subdir-c", onerror=util.force_rm)
+    util.rmtree_force("subdir-c")
     status["RM"] += 12
     status["LC"] -= 12  # root-10.git + subdir-c + subdir-f/subfile-1.annex
     util.assert_status(r, status=status)
@@ -146,14 +175,12 @@ def test_local_only(runner):
     # Add new files, remove some existing ones, check status and upload
     util.mkrandfile("new-annex-file", 10021)
     util.mkrandfile("new-git-file", 10)
-    shutil.rmtree("subdir-f", onerror=util.force_rm)
+    util.rmtree_force("subdir-f")
     status["RM"] += 9
     status["??"] += 2
     status["LC"] -= 9
     util.assert_status(r, status=status)
 
-    print("Done!")
-
 
 def test_create_remote_on_add(runner):
     r = runner
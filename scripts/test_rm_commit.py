@@ -5,6 +5,7 @@ import os
 import tempfile
 from runner import Runner
 import util
+import snapshot
 import pytest
 
 
@@ -12,14 +13,17 @@ import pytest
 def runner():
     remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
     r = Runner(False)
-    reponame = util.randrepo()
-    os.mkdir(reponame)
-    r.cdrel(reponame)
-    r.runcommand("gin", "init")
-    r.runcommand("gin", "add-remote", "--create", "--default",
-                 "origin", f"dir:{remoteloc.name}")
-    r.runcommand("gin", "upload")
 
+    def build():
+        reponame = util.randrepo()
+        os.mkdir(reponame)
+        r.cdrel(reponame)
+        r.runcommand("gin", "init")
+        r.runcommand("gin", "add-remote", "--create", "--default",
+                     "origin", f"dir:{remoteloc.name}")
+        r.runcommand("gin", "upload")
+
+    snapshot.cached(r, build, dirs=[remoteloc.name])
     r.repositories[r.cmdloc] = None
 
     yield r
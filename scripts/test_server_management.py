@@ -1,4 +1,4 @@
-from runner import Runner
+from runner import Runner, servers
 import util
 import pytest
 import json
@@ -29,6 +29,10 @@ def runner():
 
     # cleanup
     r.cleanup()
+    # tests replace Runner.cleanup(), which releases the test server (if a
+    # test fails before replacing it, the server was released by cleanup()
+    # and is None)
+    servers.release(r.server)
 
 
 def test_add_server_prompt(runner):
@@ -1,6 +1,7 @@
 import os
 import tempfile
 import util
+import snapshot
 from runner import Runner
 import pytest
 
@@ -19,19 +20,12 @@ def revhash(r, num, paths=None):
 
 
 def create_files(r):
-    fnames = list()
     # make a few annex and git files
-    os.makedirs("smallfiles", exist_ok=True)
-    os.makedirs("datafiles", exist_ok=True)
-    for idx in range(5):
-        name = os.path.join("smallfiles", f"smallfile-{idx:03}")
-        util.mkrandfile(name, 20)
-        fnames.append(name)
-    for idx in range(10):
-        name = os.path.join("datafiles", f"datafile-{idx:03}")
-        util.mkrandfile(name, 2000)
-        fnames.append(name)
-    return fnames
+    spec = [(os.path.join("smallfiles", f"smallfile-{idx:03}"), 20)
+            for idx in range(5)]
+    spec += [(os.path.join("datafiles", f"datafile-{idx:03}"), 2000)
+             for idx in range(10)]
+    return util.mktree(spec)
 
 
 @pytest.mark.slow
@@ -40,8 +34,13 @@ def test_repo_versioning(runner):
     r = runner
     assert util.getrevcount(r) == r.commitcount
 
+    # check every revision against the manifest using the annex keys and git
+    # objects, without downloading any content
+    for rev in r.manifest:
+        util.assert_revision(r, r.manifest.tree(rev), rev)
+
     head = revhash(r, 1)
-    repofiles = list(r.hashes[head].keys())
+    repofiles = list(r.manifest.tree(head))
 
     def checkout_and_compare(selection=None, revision=None,
                              fnames=None, dirnames=None):
@@ -90,11 +89,11 @@ def test_repo_versioning(runner):
         newn = util.getrevcount(r)
         assert expecting_changes == (newn == curtotalrev + 1),\
             "Version command did not create a new commit"
-        # compute current hashes and compare with old entry in dict
+        # compute current hashes and compare with manifest entries
         head, curhashes = util.hashtree(r)
-        assert expecting_changes == (head not in r.hashes),\
+        assert expecting_changes == (head not in r.manifest),\
             "New head same as an old head"
-        r.hashes[head] = curhashes
+        r.manifest.commit(head, curhashes)
 
         if fnames is not None or dirnames is not None:
             changedfiles = list()
@@ -117,11 +116,11 @@ def test_repo_versioning(runner):
         # compare all changed files with oldrevhash
         # and the rest with precorevhash
         for fname in changedfiles:
-            if fname in r.hashes[oldrevhash]:
-                assert curhashes[fname] == r.hashes[oldrevhash][fname]
+            if (oldrevhash, fname) in r.manifest:
+                assert curhashes[fname] == r.manifest[oldrevhash, fname]
                 # else file didn't exist in oldrev
         for fname in unchangedfiles:
-            assert curhashes[fname] == r.hashes[precorevhash][fname]
+            assert curhashes[fname] == r.manifest[precorevhash, fname]
 
     checkout_and_compare(4)
     checkout_and_compare(8)
@@ -152,7 +151,7 @@ def test_repo_versioning(runner):
 
     assert util.getrevcount(r) == r.commitcount
 
-    revhashes = list(r.hashes.keys())
+    revhashes = list(r.manifest)
 
     checkout_and_compare(revision=revhashes[8])
     checkout_and_compare(revision=revhashes[4], fnames=repofiles[3:])
@@ -190,7 +189,7 @@ def test_version_copyto(runner):
             assert not os.path.islink(fn)
             cohash = util.md5sum(fn)
             origname = fn[len(dest)+1:-18]
-            assert cohash == r.hashes[oldrevhash][origname],\
+            assert cohash == r.manifest[oldrevhash, origname],\
                 "Checked out file hash verification failed"
 
     get_old_files(3, ["smallfiles/smallfile-002"], "checkouts")
@@ -213,39 +212,49 @@ def test_version_copyto(runner):
 def runner():
     remoteloc = tempfile.TemporaryDirectory(prefix="gintest-remote")
     r = Runner(False)
-    # create repo (remote and local) and cd into directory
-    reponame = util.randrepo()
-    print("Setting up test repository")
-    os.mkdir(reponame)
-    r.cdrel(reponame)
-    r.runcommand("gin", "init")
-    r.runcommand("gin", "add-remote", "--create", "--default",
-                 "origin", f"dir:{remoteloc.name}")
-    r.reponame = reponame
-    r.repositories[r.cmdloc] = None
 
-    r.hashes = dict()
-    head, curhashes = util.hashtree(r)
-    r.hashes[head] = curhashes
-
-    # add files and compute their md5 hashes
-    print("Creating files")
-    create_files(r)
-    out, err = r.runcommand("gin", "commit", ".")
-    head, curhashes = util.hashtree(r)
-    r.hashes[head] = curhashes
-    r.commitcount = 2
-
-    n = 10
-    print(f"Modifying files {n} times")
-    for _ in range(n):
-        create_files(r)
-        out, err = r.runcommand("gin", "commit", ".")
+    def build():
+        # create repo (remote and local) and cd into directory
+        reponame = util.randrepo()
+        print("Setting up test repository")
+        os.mkdir(reponame)
+        r.cdrel(reponame)
+        r.runcommand("gin", "init")
+        r.runcommand("gin", "add-remote", "--create", "--default",
+                     "origin", f"dir:{remoteloc.name}")
+
+        # hash the initial commit; file digests for all following commits
+        # are recorded in the manifest when the files are created
+        manifest = util.Manifest()
         head, curhashes = util.hashtree(r)
-        r.hashes[head] = curhashes
-        r.commitcount += 1
+        manifest.commit(head, curhashes)
 
-    # TODO: Add some symlinks to the directories (not Windows)
+        # add files and record their md5 hashes
+        print("Creating files")
+        manifest.update(create_files(r))
+        out, err = r.runcommand("gin", "commit", ".")
+        manifest.commit(revhash(r, 1))
+        commitcount = 2
+
+        n = 10
+        print(f"Modifying files {n} times")
+        for _ in range(n):
+            manifest.update(create_files(r))
+            out, err = r.runcommand("gin", "commit", ".")
+            manifest.commit(revhash(r, 1))
+            commitcount += 1
+
+        # TODO: Add some symlinks to the directories (not Windows)
+
+        return {"reponame": reponame, "commitcount": commitcount,
+                "manifest": manifest.asdict()}
+
+    # the built repository and remote are cached between runs
+    state = snapshot.cached(r, build, dirs=[remoteloc.name])
+    r.reponame = state["reponame"]
+    r.commitcount = state["commitcount"]
+    r.manifest = util.Manifest.fromdict(state["manifest"])
+    r.repositories[r.cmdloc] = None
 
     # verify commit count before returning
     assert util.getrevcount(r) == r.commitcount
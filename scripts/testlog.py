@@ -0,0 +1,207 @@
+"""
+Logging backend for the test runners.
+
+Messages and command records are put on a queue and written to disk by a
+background thread:
+- Log messages go to runner.log in the log directory.
+- Each command run by a runner is written as a JSON line to a file for the
+  current test under tests/ in the log directory.
+When running under pytest-xdist, each worker uses a subdirectory of the log
+directory named after the worker ID.
+
+Command output is truncated to OUTPUTCAP characters in both. All log files
+are rotated when they reach MAXBYTES and the rotated files are compressed.
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import shutil
+import threading
+
+
+# size at which log files are rotated and number of rotated files to keep
+MAXBYTES = 32 * 1024 * 1024
+BACKUPS = 3
+
+# maximum number of characters of command output written to the logs
+OUTPUTCAP = 16 * 1024
+
+logdir = os.path.realpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "log"
+))
+if os.environ.get("PYTEST_XDIST_WORKER"):
+    # separate logs for each pytest-xdist worker
+    logdir = os.path.join(logdir, os.environ["PYTEST_XDIST_WORKER"])
+
+# name of the running test (set by conftest.py)
+currenttest = None
+
+_logger = logging.getLogger("gintest")
+_listener = None
+_lock = threading.Lock()
+
+
+def _gzrotator(source, dest):
+    with open(source, "rb") as srcfile, gzip.open(dest, "wb") as destfile:
+        shutil.copyfileobj(srcfile, destfile)
+    os.remove(source)
+
+
+def _rotatinghandler(path):
+    handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=MAXBYTES, backupCount=BACKUPS, delay=True
+    )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzrotator
+    return handler
+
+
+class _JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        return json.dumps(record.entry)
+
+
+class _TestFileHandler(logging.Handler):
+    """
+    Writes command records to a separate rotating JSON lines file for each
+    test. A test's file is closed when its end is logged with endtest().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = dict()
+
+    def emit(self, record):
+        name = record.test or "session"
+        if getattr(record, "endtest", False):
+            handler = self.handlers.pop(name, None)
+            if handler:
+                handler.close()
+            return
+        handler = self.handlers.get(name)
+        if handler is None:
+            testdir = os.path.join(logdir, "tests")
+            os.makedirs(testdir, exist_ok=True)
+            # make the test ID usable as a file name
+            fname = re.sub(r"[^\w.\[\]-]+", "_", name) + ".jsonl"
+            handler = _rotatinghandler(os.path.join(testdir, fname))
+            handler.setFormatter(_JSONFormatter())
+            self.handlers[name] = handler
+        handler.emit(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        super().close()
+
+
+def _start():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(logdir, exist_ok=True)
+        msghandler = _rotatinghandler(os.path.join(logdir, "runner.log"))
+        msghandler.addFilter(lambda record: not hasattr(record, "test"))
+        testhandler = _TestFileHandler()
+        testhandler.addFilter(lambda record: hasattr(record, "test"))
+        logq = queue.Queue()
+        _logger.addHandler(logging.handlers.QueueHandler(logq))
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _listener = logging.handlers.QueueListener(logq, msghandler,
+                                                   testhandler,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop)
+
+
+def stop():
+    """
+    Write all queued records and close the log files. Logging starts again on
+    the next call to any of the logging functions.
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for handler in _logger.handlers[:]:
+            _logger.removeHandler(handler)
+        _listener = None
+
+
+def truncate(text):
+    """
+    Shorten text (or bytes) longer than OUTPUTCAP by cutting out the middle.
+    """
+    if len(text) <= OUTPUTCAP:
+        return text
+    half = OUTPUTCAP // 2
+    cut = len(text) - 2 * half
+    marker = f"\n[... {cut} characters truncated ...]\n"
+    if isinstance(text, bytes):
+        marker = marker.encode("utf-8")
+    return text[:half] + marker + text[-half:]
+
+
+def log(msg):
+    """
+    Write a message to runner.log.
+    """
+    _start()
+    _logger.info(truncate(msg))
+
+
+def command(result, cwd):
+    """
+    Write a record of a finished command (a runner.CommandResult) to the
+    current test's log file.
+    """
+    _start()
+    entry = {
+        "test": currenttest,
+        "start": result.start,
+        "command": list(result.args),
+        "cwd": cwd,
+        "duration": result.duration,
+        "exitcode": result.returncode,
+        "usage": result.usage,
+    }
+    for name in ("stdout", "stderr"):
+        output = getattr(result, name)
+        if isinstance(output, bytes):
+            entry[name] = f"<{len(output)} bytes>"
+        elif isinstance(output, int):
+            # streamed: only the beginning of text output is kept
+            if result.output is not None:
+                entry[name] = truncate(result.output)
+            else:
+                entry[name] = f"<{output} streamed>"
+        else:
+            entry[name] = truncate(output)
+    _logger.info("command", extra={"test": currenttest, "entry": entry})
+
+
+def starttest(name):
+    global currenttest
+    currenttest = name
+
+
+def endtest():
+    """
+    Close the current test's log file.
+    """
+    global currenttest
+    _start()
+    _logger.info("end", extra={"test": currenttest, "endtest": True})
+    currenttest = None
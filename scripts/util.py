@@ -1,24 +1,209 @@
 import os
 import stat
-from random import randint
+import shutil
+import json
+import hashlib
+import subprocess as sp
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from random import randint, Random
 from hashlib import md5
 
 
+# block size for generating and reading file content
+BLOCKSIZE = 1024 * 1024
+
+# files larger than this are dropped from the page cache after checksum()
+DROPCACHESIZE = 64 * BLOCKSIZE
+
+# annex pointer files and symlink blobs are never larger than this
+MAXPOINTERSIZE = 8192
+
+# hashlib algorithm used by each git-annex key backend (without the E suffix)
+ANNEXBACKENDS = {
+    "MD5": "md5",
+    "SHA1": "sha1",
+    "SHA224": "sha224",
+    "SHA256": "sha256",
+    "SHA384": "sha384",
+    "SHA512": "sha512",
+}
+
+# name of the hashtree() cache file in a repository's git directory
+HASHCACHE = "gin-test-hashcache.json"
+
+
+# repository names returned by randrepo()
+_reponames = set()
+_reponameslock = threading.Lock()
+
+
 def zerostatus():
     return {"OK": 0, "TC": 0, "NC": 0, "MD": 0, "LC": 0, "RM": 0, "??": 0}
 
 
 def randrepo():
-    return f"gin-test-{randint(0, 9999):04}"
+    """
+    Random test repository name that is unique within the test session.
+    When running under pytest-xdist, the name includes the worker ID, so
+    parallel workers never pick the same name.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    prefix = f"gin-test-{worker}-" if worker else "gin-test-"
+    with _reponameslock:
+        while True:
+            name = f"{prefix}{randint(0, 999999):06}"
+            if name not in _reponames:
+                _reponames.add(name)
+                return name
 
 
-def mkrandfile(name, size=100):
+def mkrandfile(name, size=100, seed=None):
     """
     Make a random binary file with a given name and size in kilobytes
-    (default: 100k)
+    (default: 100k) and return the md5 hex digest of its content.
+
+    The content is generated in blocks of BLOCKSIZE bytes from a PRNG seeded
+    with `seed` (system entropy if not set), so memory use does not depend on
+    the size of the file. The same seed and size always produce the same
+    content.
     """
+    rng = Random(seed)
+    msum = md5()
+    remaining = size * 1024
+    buf = bytearray(BLOCKSIZE)
+    view = memoryview(buf)
     with open(name, "wb") as f:
-        f.write(os.urandom(size*1024))
+        while remaining > 0:
+            n = min(remaining, BLOCKSIZE)
+            # same bytes as Random.randbytes(n) (Python 3.9+)
+            buf[:n] = rng.getrandbits(n * 8).to_bytes(n, "little")
+            f.write(view[:n])
+            msum.update(view[:n])
+            remaining -= n
+    return msum.hexdigest()
+
+
+FileSpec = namedtuple("FileSpec", ("size", "seed", "digest"))
+
+
+def _writespec(item):
+    name, size, seed = item
+    os.makedirs(os.path.dirname(name) or ".", exist_ok=True)
+    return mkrandfile(name, size, seed)
+
+
+def mktree(spec, root=".", workers=None, processes=False):
+    """
+    Create a tree of random files described by `spec`, an iterable of
+    (path, size) or (path, size, seed) tuples. Paths are relative to `root`
+    and missing parent directories are created. Sizes are in kilobytes, as
+    in mkrandfile().
+
+    Files are written concurrently by `workers` threads (default: number of
+    CPUs), or processes if `processes` is True.
+
+    Returns a manifest dictionary mapping each path to a FileSpec with the
+    size, seed and md5 digest of the file. Entries without a seed get a
+    random one, so the manifest can always be used to regenerate the same
+    content.
+    """
+    seeded = list()
+    for entry in spec:
+        path, size, *seed = entry
+        seed = seed[0] if seed else None
+        if seed is None:
+            seed = randint(0, 2**32-1)
+        seeded.append((path, size, seed))
+
+    # largest files first for better load distribution
+    order = sorted(seeded, key=lambda item: item[1], reverse=True)
+    items = [(os.path.join(root, path), size, seed)
+             for path, size, seed in order]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        digests = dict(zip((path for path, _, _ in order),
+                           pool.map(_writespec, items)))
+
+    return {path: FileSpec(size, seed, digests[path])
+            for path, size, seed in seeded}
+
+
+class Manifest(object):
+    """
+    Expected md5 digests of the files in a repository for each revision.
+
+    The working tree state is built up with update() and remove() as files
+    are written (e.g., from the return values of mkrandfile() or mktree())
+    and deleted, and is recorded for a revision with commit(). Digests can
+    then be looked up by (revision, path) without hashing the files again.
+    """
+
+    def __init__(self):
+        self.worktree = dict()
+        self.revisions = dict()
+
+    def update(self, files):
+        """
+        Set the digests of files in the working tree. `files` maps paths to
+        digests or FileSpec entries.
+        """
+        for path, digest in files.items():
+            if isinstance(digest, FileSpec):
+                digest = digest.digest
+            self.worktree[os.path.normpath(path)] = digest
+
+    def remove(self, *paths):
+        for path in paths:
+            self.worktree.pop(os.path.normpath(path), None)
+
+    def commit(self, revision, tree=None):
+        """
+        Record the working tree state (or `tree` if given, which also becomes
+        the new working tree state) for the given revision. Paths are stored
+        in sorted order, like the output of `git ls-files`.
+        """
+        if tree is not None:
+            self.worktree = dict(tree)
+        self.revisions[revision] = dict(sorted(self.worktree.items()))
+
+    def tree(self, revision):
+        return self.revisions[revision]
+
+    def asdict(self):
+        """
+        JSON serialisable copy of the manifest (see fromdict()).
+        """
+        return {"worktree": dict(self.worktree),
+                "revisions": {rev: dict(tree)
+                              for rev, tree in self.revisions.items()}}
+
+    @classmethod
+    def fromdict(cls, data):
+        manifest = cls()
+        manifest.worktree = dict(data["worktree"])
+        manifest.revisions = {rev: dict(tree)
+                              for rev, tree in data["revisions"].items()}
+        return manifest
+
+    def __getitem__(self, key):
+        revision, path = key
+        return self.revisions[revision][os.path.normpath(path)]
+
+    def __contains__(self, key):
+        if isinstance(key, tuple):
+            revision, path = key
+            return os.path.normpath(path) in self.revisions.get(revision, {})
+        return key in self.revisions
+
+    def __iter__(self):
+        return iter(self.revisions)
+
+    def __len__(self):
+        return len(self.revisions)
 
 
 def getrevcount(r):
@@ -29,46 +214,414 @@ def getrevcount(r):
     return int(n)
 
 
-def assert_status(r, path=".", status=dict()):
+def lsstatus(r, path="."):
+    """
+    Run `gin ls --short` and return a dictionary mapping each listed path to
+    its status code.
+    """
+    statmap = dict()
+    for line in r.stream("gin", "ls", "--short", path):
+        line = line.rstrip("\r\n")
+        if line:
+            # <code> <path>
+            statmap[line[3:]] = line[:2]
+    return statmap
+
+
+def statuscounts(statmap):
+    """
+    Count the paths for each status code in a lsstatus() dictionary.
+    """
+    counts = zerostatus()
+    for code in statmap.values():
+        counts[code] = counts.get(code, 0) + 1
+    return counts
+
+
+def dirstatus(statmap):
+    """
+    Count the paths for each status code in each directory of a lsstatus()
+    dictionary. Returns a dictionary mapping directories to counts.
+    """
+    dirs = dict()
+    for fname, code in statmap.items():
+        counts = dirs.setdefault(os.path.dirname(fname) or ".", dict())
+        counts[code] = counts.get(code, 0) + 1
+    return dirs
+
+
+def assert_status(r, path=".", status=dict(), paths=None):
     """
     Run `gin ls --short` and check the count for each status against the given
-    `status` dictionary.
+    `status` dictionary. If `paths` is given, also check the status code of
+    each listed path against it.
+
+    On failure, the paths with mismatched status codes and the counts for
+    each directory are reported.
+    """
+    statmap = lsstatus(r, path)
+    counts = statuscounts(statmap)
+    actual = {code: counts.get(code, 0) for code in status}
+    msg = ""
+    if status != actual:
+        msg += (f"Status count mismatch\n"
+                f"Exp: {status}\n"
+                f"Act: {actual}\n")
+        for code in status:
+            if status[code] != actual[code]:
+                fnames = sorted(f for f, c in statmap.items() if c == code)
+                msg += f"{code}: {_abbrevlist(fnames)}\n"
+    if paths is not None:
+        diff = {fname: (paths.get(fname), statmap.get(fname))
+                for fname in set(paths) | set(statmap)
+                if paths.get(fname) != statmap.get(fname)}
+        if diff:
+            msg += "Path status mismatch (exp, act)\n"
+            for fname, (exp, act) in sorted(diff.items()):
+                msg += f"{fname}: {exp}, {act}\n"
+    if msg:
+        msg += "Directory counts\n"
+        for dirname, dircounts in sorted(dirstatus(statmap).items()):
+            msg += f"{dirname}: {dircounts}\n"
+    assert not msg, msg
+
+
+def _abbrevlist(items, n=20):
+    if len(items) > n:
+        return ", ".join(items[:n]) + f", ... ({len(items)-n} more)"
+    return ", ".join(items)
+
+
+def checksum(filename, algorithm="md5"):
+    """
+    Compute the hex digest of a file's content with the given hashlib
+    algorithm (e.g., md5, sha256, blake2b).
+
+    The file is read in blocks of BLOCKSIZE bytes into a single buffer.
+    Where supported, the kernel is told the file is read sequentially and,
+    for files larger than DROPCACHESIZE, to drop it from the page cache
+    afterwards so that verifying large files doesn't evict everything else.
+    """
+    fhash = hashlib.new(algorithm)
+    buf = bytearray(BLOCKSIZE)
+    view = memoryview(buf)
+    with open(filename, "rb", buffering=0) as thefile:
+        fd = thefile.fileno()
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        size = 0
+        while True:
+            n = thefile.readinto(buf)
+            if not n:
+                break
+            fhash.update(view[:n])
+            size += n
+        if hasattr(os, "posix_fadvise") and size > DROPCACHESIZE:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    return fhash.hexdigest()
+
+
+def checksums(filenames, algorithm="md5", workers=None):
+    """
+    Compute checksum() for multiple files concurrently using `workers`
+    threads (default: number of CPUs). Returns a dictionary mapping each
+    filename to its digest.
     """
-    out, err = r.runcommand("gin", "ls", "--short", path)
-    actual = {}
-    for code, count in status.items():
-        s = sum(1 for line in out.splitlines() if line.startswith(code))
-        actual[code] = s
-    assert status == actual, (f"Status count mismatch\n"
-                              f"Exp: {status}\n"
-                              f"Act: {actual}")
+    filenames = list(filenames)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = pool.map(checksum, filenames,
+                           [algorithm] * len(filenames))
+        return dict(zip(filenames, digests))
 
 
 def md5sum(filename, printhash=False):
-    with open(filename, "rb") as thefile:
-        fdata = thefile.read()
-        msum = md5(fdata).hexdigest()
-    return msum
+    return checksum(filename, "md5")
+
+
+def _statkey(st):
+    return [st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+
+def _loadhashcache(cachefile):
+    try:
+        with open(cachefile) as cf:
+            return json.load(cf)
+    except (OSError, ValueError):
+        return dict()
 
 
 def hashtree(r):
+    """
+    Download all annexed content and compute the md5 digest of each file in
+    the working tree. Returns the HEAD revision and a dictionary mapping
+    paths to digests.
+
+    Digests are cached in the repository's git directory keyed on each file's
+    inode, size, mtime and ctime, so a file is only read again if it changed
+    since the last call.
+    """
     curtree = dict()
-    head, err = r.runcommand("git", "rev-parse", "HEAD")
+    out, err = r.runcommand("git", "rev-parse", "HEAD", "--absolute-git-dir")
+    head, gitdir = out.splitlines()
     print(f"Hashing files in working tree (at {head})")
 
     gitfiles, err = r.runcommand("git", "ls-files")
     gitfiles = gitfiles.splitlines()
     r.runcommand("gin", "get-content", ".")
+
+    cachefile = os.path.join(gitdir, HASHCACHE)
+    cache = _loadhashcache(cachefile)
+    # Files modified at or after this point (in filesystem time) can't be
+    # trusted to show a new mtime on a later change, so they are not cached.
+    # Same as git's handling of "racily clean" index entries.
+    with open(cachefile, "a"):
+        os.utime(cachefile)
+    fsnow = os.stat(cachefile).st_mtime_ns
+
+    stats = dict()
     for filepath in gitfiles:
         # normalise path separator (for Windows)
         filepath = os.path.normpath(filepath)
-        msum = md5sum(filepath)
-        curtree[filepath] = msum
-        # print(f"{filepath}: {msum}")
+        fullpath = os.path.join(r.cmdloc, filepath)
+        key = _statkey(os.stat(fullpath))
+        cached = cache.get(fullpath)
+        if cached and cached[:4] == key:
+            curtree[filepath] = cached[4]
+        stats[filepath] = (fullpath, key)
+
+    changed = [fullpath for filepath, (fullpath, _) in stats.items()
+               if filepath not in curtree]
+    digests = checksums(changed)
+    newcache = dict()
+    for filepath, (fullpath, key) in stats.items():
+        if filepath not in curtree:
+            curtree[filepath] = digests[fullpath]
+        if key[2] < fsnow and key[3] < fsnow:
+            newcache[fullpath] = key + [curtree[filepath]]
+
+    with open(cachefile, "w") as cf:
+        json.dump(newcache, cf)
+    print(f"Hashed {len(changed)} of {len(gitfiles)} files")
 
     return head, curtree
 
 
+class CatFile(object):
+    """
+    Reads objects from a repository through long-lived `git cat-file
+    --batch-check` and `git cat-file --batch` processes, started on first
+    use. Requests are answered one at a time, so object content is streamed
+    from the pipe without holding the whole object in memory.
+
+    Objects should be named by id: the processes read the index only once,
+    so names like ':<path>' may refer to stale index entries.
+    """
+
+    def __init__(self, r):
+        self.cwd = r.cmdloc
+        self.env = r.env
+        self.procs = dict()
+        self.lock = threading.Lock()
+        out, err = r.runcommand("git", "rev-parse", "--absolute-git-dir")
+        self.gitdir = out
+        self.gitdirid = _fileid(self.gitdir)
+
+    def valid(self):
+        """
+        False if the repository has been deleted or replaced since the
+        session was started.
+        """
+        return _fileid(self.gitdir) == self.gitdirid
+
+    def _request(self, mode, obj):
+        proc = self.procs.get(mode)
+        if proc is None:
+            proc = sp.Popen(["git", "cat-file", f"--{mode}"],
+                            stdin=sp.PIPE, stdout=sp.PIPE,
+                            cwd=self.cwd, env=self.env)
+            self.procs[mode] = proc
+        proc.stdin.write(obj.encode("utf-8") + b"\n")
+        proc.stdin.flush()
+        header = proc.stdout.readline().decode("utf-8").split()
+        if len(header) != 3:
+            # "<object> missing" or "<object> ambiguous"
+            return None
+        oid, otype, size = header
+        return oid, otype, int(size)
+
+    def _chunks(self, size):
+        stdout = self.procs["batch"].stdout
+        remaining = size
+        while remaining > 0:
+            chunk = stdout.read(min(remaining, BLOCKSIZE))
+            remaining -= len(chunk)
+            yield chunk
+        # object content is followed by a newline
+        stdout.read(1)
+
+    def info(self, obj):
+        """
+        Return the id, type and size of an object or None if it doesn't
+        exist.
+        """
+        with self.lock:
+            return self._request("batch-check", obj)
+
+    def read(self, obj):
+        """
+        Return the content of an object or None if it doesn't exist.
+        """
+        with self.lock:
+            header = self._request("batch", obj)
+            if header is None:
+                return None
+            return b"".join(self._chunks(header[2]))
+
+    def checksum(self, obj, algorithm="md5"):
+        """
+        Return the hex digest of an object's content or None if it doesn't
+        exist.
+        """
+        with self.lock:
+            header = self._request("batch", obj)
+            if header is None:
+                return None
+            ohash = hashlib.new(algorithm)
+            for chunk in self._chunks(header[2]):
+                ohash.update(chunk)
+            return ohash.hexdigest()
+
+    def close(self):
+        with self.lock:
+            for proc in self.procs.values():
+                proc.stdin.close()
+                proc.wait()
+                proc.stdout.close()
+            self.procs.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fileid(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def catfile(r):
+    """
+    Return the CatFile session for the repository at the runner's working
+    directory, starting a new one if there is none or if the repository was
+    replaced. Sessions are kept in r.catfiles and closed by r.cleanup().
+    """
+    cf = r.catfiles.get(r.cmdloc)
+    if cf is None or not cf.valid():
+        if cf is not None:
+            cf.close()
+        cf = r.catfiles[r.cmdloc] = CatFile(r)
+    return cf
+
+
+def annexkey(content):
+    """
+    Return the git-annex key from the content of an annex pointer file or
+    symlink blob, or None if the content isn't an annex pointer.
+    """
+    if len(content) > MAXPOINTERSIZE or b"/annex/objects/" not in content:
+        return None
+    try:
+        target = content.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        return None
+    return target.split("/")[-1]
+
+
+def parsekey(key):
+    """
+    Split a git-annex key (e.g., MD5E-s1024--<md5>.annex) into its backend
+    name (without the E suffix), size and hash.
+    """
+    fields, name = key.split("--", 1)
+    backend, *fields = fields.split("-")
+    size = None
+    for field in fields:
+        if field.startswith("s"):
+            size = int(field[1:])
+    if backend.endswith("E"):
+        backend = backend[:-1]
+        # drop the extension
+        name = name.split(".", 1)[0]
+    return backend, size, name
+
+
+def revdigests(r, rev="HEAD", algorithm="md5"):
+    """
+    Compute the digest of each file in a revision without reading annexed
+    content. Returns a dictionary mapping paths to digests.
+
+    For annexed files, the hash is taken from the annex key if the key's
+    backend uses `algorithm` (gin's default MD5E backend does for md5). Other
+    annexed files are hashed from the local annex object if it's available and
+    are None otherwise. Files stored in git are hashed from the git object
+    database.
+    """
+    out, err = r.runcommand("git", "ls-tree", "-r", "-l", "-z", rev)
+    tree = dict()
+    cf = catfile(r)
+    for entry in out.split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        mode, otype, oid, size = meta.split()
+        path = os.path.normpath(path)
+        if otype != "blob":
+            # submodule
+            continue
+        if int(size) > MAXPOINTERSIZE:
+            tree[path] = cf.checksum(oid, algorithm)
+            continue
+        content = cf.read(oid)
+        key = annexkey(content)
+        if key is None:
+            tree[path] = hashlib.new(algorithm, content).hexdigest()
+            continue
+        backend, _, keyhash = parsekey(key)
+        if ANNEXBACKENDS.get(backend) == algorithm:
+            tree[path] = keyhash
+            continue
+        loc, err = r.runcommand("git", "annex", "contentlocation", key,
+                                exit=False)
+        if loc:
+            tree[path] = checksum(os.path.join(r.cmdloc, loc), algorithm)
+        else:
+            tree[path] = None
+    return tree
+
+
+def assert_revision(r, expected, rev="HEAD", algorithm="md5"):
+    """
+    Check the digests of all files in a revision, computed with
+    revdigests(), against the `expected` dictionary of paths and digests
+    (e.g., a revision's tree from a Manifest).
+    """
+    actual = revdigests(r, rev, algorithm)
+    mismatch = {path: (expected.get(path), actual.get(path))
+                for path in set(expected) | set(actual)
+                if expected.get(path) != actual.get(path)}
+    assert not mismatch, (f"Digest mismatch in revision {rev}\n" +
+                          "\n".join(f"{path}: exp {exp} act {act}"
+                                    for path, (exp, act)
+                                    in sorted(mismatch.items())))
+
+
 def lsfiles(path):
     files = []
     for root, dirs, fnames in os.walk(path):
@@ -77,28 +630,45 @@ def lsfiles(path):
     return files
 
 
-def isannexed(r, fname):
+def annexed(r, paths=(".",)):
     """
-    Figure out if a file is annexed or not:
-    - If the file's git content is binary (UnicodeDecodeError), it's not
+    Figure out which files are annexed. Returns a dictionary mapping each
+    file in the index that matches `paths` (relative to the runner's working
+    directory) to True if it's annexed or False otherwise:
+    - If the file's git object is larger than MAXPOINTERSIZE, it's not
       annexed [False]
-    - If it's not binary and the contents include the string "/objects/", it's
-      a pointer file for annexed content [True]
-    - If it's a symlink, it's a pointer file for annexed content [True]
+    - If the git object (the file content or the symlink target) includes
+      the string "/annex/objects/", it's a pointer file for annexed content
+      [True]
     - Otherwise, it's not annexed [False]
+
+    Only the header and content of small objects are read, through the
+    repository's long-lived CatFile session.
     """
-    try:
-        out, err = r.runcommand("git", "cat-file", "-p", f":{fname}")
-    except (UnicodeDecodeError, IndexError):
-        # For some reason on Windows a UnicodeDecodeError results in an
-        # IndexError
-        # binary file in git -> not annexed
-        return False
-    if "/objects/" in out:
-        return True
-    if os.path.islink(fname):
-        return True
-    return False
+    out, err = r.runcommand("git", "--literal-pathspecs", "ls-files",
+                            "--stage", "-z", "--", *paths)
+    cf = catfile(r)
+    result = dict()
+    for entry in out.split("\0"):
+        if not entry:
+            continue
+        meta, path = entry.split("\t", 1)
+        mode, oid, stage = meta.split()
+        if mode != "120000":
+            _, _, size = cf.info(oid)
+            if size > MAXPOINTERSIZE:
+                result[path] = False
+                continue
+        result[path] = annexkey(cf.read(oid)) is not None
+    return result
+
+
+def isannexed(r, fname):
+    """
+    Figure out if a file is annexed or not (see annexed()). Files that aren't
+    in the index are not annexed.
+    """
+    return any(annexed(r, [fname]).values())
 
 
 def force_rm(func, path, excinfo):
@@ -106,8 +676,71 @@ def force_rm(func, path, excinfo):
     func(path)
 
 
-def set_rwx_recursive(path):
-    # set full permissions on everything under the tempdir
+# the parallel walk works on directory file descriptors, which are not
+# supported on all platforms (Windows)
+FDWALK = (os.scandir in os.supports_fd and
+          os.chmod in os.supports_dir_fd and
+          os.unlink in os.supports_dir_fd)
+
+
+def _fixdir(path, remove):
+    """
+    Give full permissions to the subdirectories of a directory and return
+    them. Other entries are given full permissions too (except symlinks), or
+    are removed if `remove` is set (removing only needs permissions on the
+    directory).
+
+    Entries that already have full permissions are left alone.
+    """
+    subdirs = list()
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        with os.scandir(fd) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(os.path.join(path, entry.name))
+                elif remove:
+                    os.unlink(entry.name, dir_fd=fd)
+                    continue
+                elif entry.is_symlink():
+                    continue
+                mode = entry.stat(follow_symlinks=False).st_mode
+                if stat.S_IMODE(mode) != 0o777:
+                    os.chmod(entry.name, 0o777, dir_fd=fd)
+    finally:
+        os.close(fd)
+    return subdirs
+
+
+def _walkdirs(path, remove, workers):
+    """
+    Run _fixdir() on a directory tree, one level at a time with the
+    directories of each level in parallel (or serially if `workers` is 0).
+    Returns all directories in the tree in breadth first order.
+    """
+    if stat.S_IMODE(os.lstat(path).st_mode) != 0o777:
+        os.chmod(path, 0o777)
+    alldirs = [path]
+    level = [path]
+    executor = None
+    mapper = map
+    if workers != 0:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        mapper = executor.map
+    try:
+        while level:
+            results = mapper(_fixdir, level, [remove] * len(level))
+            level = [subdir for subdirs in results for subdir in subdirs]
+            alldirs.extend(level)
+    finally:
+        if executor:
+            executor.shutdown()
+    return alldirs
+
+
+def _walkfix(path):
+    # set full permissions on everything under path, for platforms without
+    # directory file descriptors (Windows)
     for root, dirs, files in os.walk(path):
         for d in dirs:
             dname = os.path.join(root, d)
@@ -116,3 +749,29 @@ def set_rwx_recursive(path):
             fname = os.path.join(root, f)
             if os.path.exists(fname):  # skip broken links
                 os.chmod(fname, 0o777)
+
+
+def set_rwx_recursive(path, workers=None):
+    """
+    Set full permissions on everything under a directory (symlinks are
+    skipped). `workers` is the number of threads (0 for none).
+    """
+    if not FDWALK:
+        os.chmod(path, 0o777)
+        _walkfix(path)
+        return
+    _walkdirs(path, False, workers)
+
+
+def rmtree_force(path, workers=None):
+    """
+    Remove a directory tree, including read-only directories such as the
+    annex object store. Permissions are only changed on directories.
+    `workers` is the number of threads (0 for none).
+    """
+    if not FDWALK:
+        _walkfix(path)
+        shutil.rmtree(path, onerror=force_rm)
+        return
+    for dname in reversed(_walkdirs(path, True, workers)):
+        os.rmdir(dname)